@@ -0,0 +1,126 @@
+"""
+Runs queries against the keyword index without the overlay or the hotkey.
+
+Reads one query per line from stdin (or --input) and writes one JSON line per
+query, in input order, to stdout (or --output):
+
+    python batch.py --mode fuzzy --limit 5 < logged_queries.txt > results.jsonl
+
+The index is loaded once; with --workers above 1 the queries are spread over
+a process pool. Where processes are forked the workers share the loaded index
+(copy-on-write), otherwise each one loads it from the snapshot.
+"""
+import argparse
+import json
+import os
+import sys
+from contextlib import redirect_stdout
+from PyQt6.QtCore import QCoreApplication
+from src.index import EXACT, MODES
+from src.search import SearchEngine
+from src.shards import process_context
+
+# Set in the parent before forking, or by _init_worker
+_engine = None
+_options = None
+
+
+def _init_worker(data_file, options, postings):
+    global _engine, _options
+    if _engine is None:
+        _engine = load_engine(data_file, postings)
+    _options = options
+
+
+def _search(query):
+    limit, mode = _options
+    return query, _engine.search(query, limit, mode)
+
+
+def load_engine(data_file, postings=True):
+    # Timers and the file watcher need a core application, not a GUI one
+    QCoreApplication.instance() or QCoreApplication([])
+    # stdout carries the results, so progress messages go to stderr
+    with redirect_stdout(sys.stderr):
+        engine = SearchEngine(data_file, postings=postings)
+    # Read the usage counts now so forked workers inherit them
+    len(engine.frecency)
+    return engine
+
+
+def read_queries(stream):
+    for line in stream:
+        query = line.rstrip('\r\n')
+        if query.strip():
+            yield query
+
+
+def non_negative(text):
+    """argparse type for counts: an int, 0 or more."""
+    value = int(text)
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more, not {value}")
+    return value
+
+
+def run(queries, output, data_file, limit=10, mode=EXACT, workers=1, chunksize=64, postings=True):
+    """Writes the results of every query to output; returns how many there were."""
+    global _engine, _options
+    _engine = load_engine(data_file, postings)
+    _options = (limit, mode)
+
+    pool = None
+    if workers > 1:
+        pool = process_context().Pool(workers, initializer=_init_worker, initargs=(data_file, _options, postings))
+        # imap keeps the input order and reads queries only as workers need them
+        results = pool.imap(_search, queries, chunksize)
+    else:
+        results = map(_search, queries)
+
+    count = 0
+    try:
+        for query, lines in results:
+            output.write(json.dumps({'query': query, 'results': lines}, ensure_ascii=False) + '\n')
+            if pool is not None:
+                # So the queries the workers answered are saved with the parent's cache
+                _engine.remember(query, limit, mode, lines)
+            count += 1
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        # Saves the usage counts and the queries to warm the result cache with
+        with redirect_stdout(sys.stderr):
+            _engine.close()
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search the keyword file for every query read, one per line.")
+    parser.add_argument('--data-file', default="keyword.txt")
+    parser.add_argument('--input', help="Query file (default: stdin)")
+    parser.add_argument('--output', help="JSON lines output file (default: stdout)")
+    parser.add_argument('--limit', type=non_negative, default=10)
+    parser.add_argument('--mode', choices=MODES, default=EXACT)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunksize', type=int, default=64, help="Queries sent to a worker at a time")
+    parser.add_argument('--no-index', action='store_true',
+                        help="Skip the trigram index and scan instead (quicker for a one-off corpus)")
+    args = parser.parse_args(argv)
+
+    source = open(args.input, encoding='utf-8') if args.input else sys.stdin
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        count = run(read_queries(source), output, args.data_file, args.limit, args.mode,
+                    args.workers, args.chunksize, not args.no_index)
+    finally:
+        if args.input:
+            source.close()
+        if args.output:
+            output.close()
+    print(f"Answered {count} queries.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import random
+from typing import Iterator, List
+
+# Syllables mixed into words: plain ASCII plus accented Latin (Vietnamese,
+# French, German) and a few CJK/Cyrillic ones, so casefolding and UTF-8
+# lengths are exercised like in real snippet files.
+SYLLABLES = [
+    'de', 'ploy', 'con', 'fig', 'ser', 'ver', 'log', 'in', 'out', 'sta', 'ging',
+    'pro', 'duc', 'tion', 'data', 'base', 'back', 'up', 'net', 'work', 'git',
+    'hub', 'dock', 'er', 'kube', 'ctl', 'py', 'thon', 'ja', 'va', 'script',
+    'cà', 'phê', 'sữa', 'đá', 'bánh', 'mì', 'phở', 'bò', 'nước', 'mắm',
+    'café', 'crème', 'straße', 'über', 'größe', 'naïve', 'résumé',
+    '東京', '設定', '検索', 'при', 'вет', 'да', 'нные',
+]
+PUNCTUATION = ['', '', '', '', ',', '.', ':', '/', '-', '()']
+
+
+class CorpusGenerator:
+    """
+    Deterministic synthetic keyword corpus.
+
+    Lines are a mix of plain phrases and "shortcut||content" entries with a
+    long tail of content lengths, drawn from a fixed vocabulary so queries can
+    be built from words that do (or do not) occur.
+    """
+
+    def __init__(self, seed: int = 0, vocabulary_size: int = 20000, pair_ratio: float = 0.6):
+        self.random = random.Random(seed)
+        self.pair_ratio = pair_ratio
+        self.vocabulary = sorted({self._word() for _ in range(vocabulary_size)})
+
+    def _word(self) -> str:
+        count = self.random.choice((1, 2, 2, 3, 3, 4))
+        word = ''.join(self.random.choice(SYLLABLES) for _ in range(count))
+        if self.random.random() < 0.1:
+            word = word.capitalize()
+        return word
+
+    def _phrase(self, count: int) -> str:
+        words = self.random.choices(self.vocabulary, k=count)
+        return ' '.join(word + self.random.choice(PUNCTUATION) for word in words)
+
+    def line(self) -> str:
+        if self.random.random() >= self.pair_ratio:
+            return self._phrase(self.random.randint(2, 8))
+        shortcut = self._phrase(self.random.randint(1, 3))
+        # Mostly short snippets, some long bodies
+        length = min(int(self.random.paretovariate(1.2) * 4), 200)
+        return f"{shortcut} || {self._phrase(length)}"
+
+    def lines(self, count: int) -> Iterator[str]:
+        for _ in range(count):
+            yield self.line()
+
+    def write(self, path: str, count: int):
+        with open(path, 'w', encoding='utf-8') as f:
+            for line in self.lines(count):
+                f.write(line + '\n')
+
+    def hit_words(self, count: int) -> List[str]:
+        return self.random.choices(self.vocabulary, k=count)
+
+    def miss_words(self, count: int) -> List[str]:
+        # 'q' and 'x' never occur in the syllables
+        return [''.join(self.random.choice('qx') for _ in range(self.random.randint(4, 8)))
+                for _ in range(count)]
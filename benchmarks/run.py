@@ -0,0 +1,243 @@
+"""
+Headless benchmarks for SearchEngine.
+
+Generates synthetic corpora, measures index build, snapshot load and query
+latency for a few query shapes, and compares against a stored baseline:
+
+    python -m benchmarks.run --sizes 1k,100k --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --sizes 1k,100k --baseline benchmarks/baseline.json
+
+Only PyQt6.QtCore is needed (no display, no pynput). Each corpus size runs in
+its own process so peak memory is measured per size.
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+from benchmarks.corpus import CorpusGenerator
+
+# (metric, absolute change below which a difference is noise)
+COMPARED = {
+    'load_s': 0.05,
+    'snapshot_load_s': 0.05,
+    'peak_rss_mb': 5.0,
+    'p50_ms': 0.05,
+    'p95_ms': 0.1,
+}
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    scale = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    values = sorted(latencies)
+    total = sum(values)
+    return {
+        'count': len(values),
+        'p50_ms': percentile(values, 50) * 1000,
+        'p95_ms': percentile(values, 95) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+        'qps': len(values) / total if total else 0.0,
+    }
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def sample_lines(path: str, count: int, rng: random.Random) -> List[str]:
+    """Reservoir-samples lines of the corpus to build hitting multi-word queries."""
+    sample = []
+    with open(path, encoding='utf-8') as f:
+        for i, line in enumerate(f):
+            if len(sample) < count:
+                sample.append(line)
+            else:
+                j = rng.randrange(i + 1)
+                if j < count:
+                    sample[j] = line
+    return sample
+
+
+def build_queries(generator: CorpusGenerator, path: str, count: int, rng: random.Random):
+    lines = sample_lines(path, count, rng)
+    multi = []
+    for line in lines:
+        words = line.replace('||', ' ').split()
+        if len(words) >= 2:
+            multi.append(' '.join(rng.sample(words, 2)))
+        elif words:
+            multi.append(words[0])
+    return {
+        'single': generator.hit_words(count),
+        'multi': multi,
+        'nohit': generator.miss_words(count),
+        'typing': generator.hit_words(max(1, count // 5)),
+    }
+
+
+def timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def run_size(size: int, queries_per_workload: int, limit: int, seed: int) -> dict:
+    """Benchmarks one corpus size. Runs in a child process."""
+    from PyQt6.QtCore import QCoreApplication
+    from src.cache import ResultCache
+    from src.search import SearchEngine
+
+    # Timers and the file watcher need a core application, not a GUI one
+    app = QCoreApplication.instance() or QCoreApplication([])
+    rng = random.Random(seed)
+    generator = CorpusGenerator(seed)
+    result = {'size': size}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'keyword.txt')
+        generator.write(path, size)
+        result['file_mb'] = os.path.getsize(path) / (1 << 20)
+
+        # Without the result cache, so repeated queries still measure a search
+        start = time.perf_counter()
+        engine = SearchEngine(path, cache_size=0)
+        result['load_s'] = time.perf_counter() - start
+        del engine
+        gc.collect()
+
+        start = time.perf_counter()
+        engine = SearchEngine(path, cache_size=0)
+        result['snapshot_load_s'] = time.perf_counter() - start
+
+        queries = build_queries(generator, path, queries_per_workload, rng)
+        workloads = {}
+        for name in ('single', 'multi', 'nohit'):
+            workloads[name] = summarize([timed(engine.search, query, limit) for query in queries[name]])
+
+        # Typing sessions: every prefix of the target, one keystroke at a time
+        latencies = []
+        for target in queries['typing']:
+            session = engine.session()
+            for end in range(1, len(target) + 1):
+                latencies.append(timed(session.search, target[:end], limit))
+        workloads['typing'] = summarize(latencies)
+
+        # The single-word queries again, the second time from the result cache
+        engine.cache = ResultCache()
+        for query in queries['single']:
+            engine.search(query, limit)
+        workloads['repeat'] = summarize([timed(engine.search, query, limit) for query in queries['single']])
+        result['workloads'] = workloads
+
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def flatten(result: dict) -> Dict[str, float]:
+    """Maps "metric" and "workload.metric" names to values."""
+    flat = {key: value for key, value in result.items() if isinstance(value, (int, float))}
+    for name, stats in result.get('workloads', {}).items():
+        for key, value in stats.items():
+            flat[f"{name}.{key}"] = value
+    return flat
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Returns a description of every metric that got worse than the baseline allows."""
+    regressions = []
+    for size, result in results.items():
+        if size not in baseline:
+            continue
+        current, previous = flatten(result), flatten(baseline[size])
+        for name, value in current.items():
+            metric = name.rsplit('.', 1)[-1]
+            old = previous.get(name)
+            if metric not in COMPARED or old is None or value is None:
+                continue
+            if value > old * (1 + tolerance) and value - old > COMPARED[metric]:
+                change = f" (+{(value / old - 1) * 100:.0f}%)" if old else ""
+                regressions.append(f"{size} {name}: {old:.3f} -> {value:.3f}{change}")
+    return regressions
+
+
+def print_report(results: Dict[str, dict]):
+    for size, result in results.items():
+        rss = result['peak_rss_mb']
+        print(f"\n{size} entries ({result['file_mb']:.1f} MB): load {result['load_s']:.2f}s, "
+              f"snapshot {result['snapshot_load_s']:.3f}s, peak RSS "
+              + (f"{rss:.0f} MB" if rss is not None else "n/a"))
+        for name, stats in result['workloads'].items():
+            print(f"  {name:<8} p50 {stats['p50_ms']:8.3f} ms  p95 {stats['p95_ms']:8.3f} ms  "
+                  f"p99 {stats['p99_ms']:8.3f} ms  {stats['qps']:10.0f} q/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark SearchEngine without a display.")
+    parser.add_argument('--sizes', default='1k,10k,100k', help="Comma-separated corpus sizes, e.g. 1k,100k,5M")
+    parser.add_argument('--queries', type=int, default=300, help="Queries per workload")
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', help="Fail if results regress against this JSON file")
+    parser.add_argument('--save-baseline', help="Write the results to this JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown ratio (0.25 = 25%%)")
+    parser.add_argument('--output', help="Write the raw results as JSON")
+    args = parser.parse_args(argv)
+
+    # A fresh process per size keeps peak memory figures independent
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for text in args.sizes.split(','):
+        size = parse_size(text)
+        with context.Pool(1) as pool:
+            results[str(size)] = pool.apply(run_size, (size, args.queries, args.limit, args.seed))
+
+    print_report(results)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions against {args.baseline}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
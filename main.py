@@ -1,8 +1,12 @@
 from PyQt6.QtWidgets import QApplication, QMessageBox
 from PyQt6.QtCore import QLockFile, QDir, QTimer
 from src.ui import SearchOverlay
-from src.search import SearchEngine
-from src.hotkey import HotkeyListener
+from src.shards import open_engine
+from src.index import PREFIX
+from src.providers import providers_from_spec
+from src.hotkey import DEFAULT_HOTKEY, HotkeyListener
+from src.metrics import tracer
+from src.ipc import LOCK_NAME, QueryServer, socket_path
 import os
 import sys
 import signal
@@ -20,33 +24,61 @@ def main():
     timer.timeout.connect(lambda: None) # No-op
     
     # Singleton Check
-    lock_file = QLockFile(os.path.join(QDir.tempPath(), 'find_box_auto_suggest.lock'))
+    lock_path = os.path.join(QDir.tempPath(), LOCK_NAME)
+    lock_file = QLockFile(lock_path)
     if not lock_file.tryLock(100):
         # App is already running
         print("Application is already running.")
         sys.exit(1)
     
     # Initialize components
-    search_engine = SearchEngine("keyword.txt")
-    window = SearchOverlay(search_engine)
+    # FINDBOX_DATA lists keyword files, directories or globs (separated by
+    # os.pathsep) to search together; each file is indexed on its own
+    search_engine = open_engine(os.environ.get('FINDBOX_DATA', "keyword.txt").split(os.pathsep))
+    # FINDBOX_HOTKEY=<ctrl>+<shift>+k changes the hotkey
+    hotkey = os.environ.get('FINDBOX_HOTKEY', DEFAULT_HOTKEY)
+    # FINDBOX_MODE=fuzzy ranks results and tolerates typos, exact keeps file order
+    # FINDBOX_PROVIDERS=clipboard,commands,files=~/notes also searches those sources
+    providers = providers_from_spec(os.environ.get('FINDBOX_PROVIDERS', ''))
+    window = SearchOverlay(search_engine, mode=os.environ.get('FINDBOX_MODE', PREFIX),
+                           hotkey_char=hotkey.rsplit('+', 1)[-1], providers=providers)
     
+    # Lets other tools query the same index: see src/ipc.py
+    query_server = QueryServer(search_engine, socket_path(lock_path))
+    try:
+        query_server.start()
+    except OSError as e:
+        # E.g. a socket path too long or a read-only directory: the overlay works without it
+        print(f"Query server not started: {e}")
+
     # Initialize Hotkey Listener
-    hotkey_listener = HotkeyListener()
+    hotkey_listener = HotkeyListener(hotkey)
     
     # Connect signal
     hotkey_listener.activated.connect(window.show_search)
     hotkey_listener.escape_pressed.connect(window.hide_if_visible)
+    # Global Escape is only listened for while the overlay is up
+    window.visibility_changed.connect(hotkey_listener.set_escape_armed)
     
     hotkey_listener.start()
     
     print("App is running. Press Ctrl+C to exit.")
-    print("Press Ctrl+Alt+F to toggle search.")
+    print(f"Press {hotkey} to toggle search.")
     
     # Run the event loop
     try:
         sys.exit(app.exec())
     finally:
         hotkey_listener.stop()
+        query_server.stop()
+        search_engine.close()
+        if tracer.enabled:
+            # FINDBOX_TRACE=1: keep the latency histograms of this run
+            trace_file = os.environ.get('FINDBOX_TRACE_FILE')
+            report = tracer.dump(trace_file, {'hotkey_hook': hotkey_listener.stats(),
+                                              'result_cache': search_engine.cache.stats()})
+            if not trace_file:
+                print(report)
 
 if __name__ == "__main__":
     main()
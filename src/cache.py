@@ -0,0 +1,123 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Sequence, Tuple
+from src.files import atomic_write
+
+# Rough cost of an entry beyond the characters of its lines
+ENTRY_OVERHEAD_CHARS = 64
+
+
+def cache_path(data_file: str) -> str:
+    return data_file + '.cache.json'
+
+
+class ResultCache:
+    """
+    Least recently used search results, bounded by entry count and by the
+    characters of the cached lines.
+
+    Keys start with (folded query, limit, mode) and end with whatever the
+    results depend on, such as the index generation: when the data changes
+    the old keys are simply never asked for again and age out.
+
+    save() writes the (query, limit, mode) of the most used entries, so the
+    next run can search them again at startup (saved_queries) and answer
+    them from the cache the first time they are typed.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 256, max_chars: int = 1 << 20,
+                 saved_entries: int = 32):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.saved_entries = saved_entries
+        # key -> [lines, size, hits], least recently used first
+        self._entries: 'OrderedDict[Hashable, list]' = OrderedDict()
+        self._chars = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[List[str]]:
+        """The cached lines for key (a copy), or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            entry[2] += 1
+            return list(entry[0])
+
+    def put(self, key: Hashable, lines: Sequence[str]):
+        if self.max_entries <= 0:
+            return
+        lines = tuple(lines)
+        size = ENTRY_OVERHEAD_CHARS + sum(len(line) for line in lines)
+        if size > self.max_chars:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._chars -= old[1]
+            self._entries[key] = [lines, size, old[2] if old else 0]
+            self._chars += size
+            while len(self._entries) > self.max_entries or self._chars > self.max_chars:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._chars -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'chars': self._chars,
+            }
+
+    def saved_queries(self) -> List[Tuple[str, int, str]]:
+        """The (query, limit, mode) written by the last save(), most used first."""
+        if not self.path or not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return [(query, limit, mode) for query, limit, mode in json.load(f)]
+        except Exception as e:
+            print(f"Error loading cached queries: {e}")
+            return []
+
+    def save(self):
+        """Writes the queries of the most used entries, most used first."""
+        if not self.path:
+            return
+        with self._lock:
+            # Most recently used first, so the sort keeps it for equal hits
+            entries = [(key[:3], entry[2]) for key, entry in reversed(self._entries.items())]
+        if not entries:
+            return
+        entries.sort(key=lambda item: -item[1])
+        queries = []
+        for query, _ in entries:
+            if query not in queries:
+                queries.append(query)
+        try:
+            with atomic_write(self.path, encoding='utf-8') as f:
+                json.dump(queries[:self.saved_entries], f, ensure_ascii=False, separators=(',', ':'))
+        except Exception as e:
+            print(f"Error saving cached queries: {e}")
@@ -0,0 +1,29 @@
+"""
+Writing files that other processes may be reading.
+
+A reader (another instance, a mapped snapshot, an editor) must never see a
+half-written file, so the data goes to a temporary file next to the target,
+which then replaces it in one step.
+"""
+import os
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = 'w', **kwargs):
+    """
+    Opens a temporary file for writing (open's mode and keyword arguments)
+    and replaces path with it when the block ends. If the block raises, path
+    is left as it was, the temporary file is removed and the error goes on.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from src.files import atomic_write
+from src.index import fold, match_tier, split_entry
+
+# A selection counts half as much after this many days
+HALF_LIFE_DAYS = 14.0
+
+
+def frecency_path(data_file: str) -> str:
+    return data_file + '.usage.json'
+
+
+class FrecencyStore:
+    """
+    Remembers which lines were picked, weighted by how recently.
+
+    Every selection adds 1 to the line's score, and scores halve every
+    half_life_days. Only the max_entries best lines are kept: when the table
+    grows a tenth past that, the lowest scores are evicted in one go.
+
+    Nothing is read until the first lookup, and selections are written out
+    after flush_every of them (or flush_seconds after the first unsaved one,
+    checked on the next selection), plus once more by flush() on exit.
+    """
+
+    def __init__(self, path: Optional[str], max_entries: int = 1000, half_life_days: float = HALF_LIFE_DAYS,
+                 flush_every: int = 10, flush_seconds: float = 60.0, strip_accents: bool = True):
+        self.path = path
+        self.max_entries = max_entries
+        self.half_life = half_life_days * 86400
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        # Must match the index, matching() gets words folded for it
+        self.strip_accents = strip_accents
+        # line -> (score, time of that score, folded shortcut, folded content); None until loaded
+        self._entries: Optional[Dict[str, Tuple[float, float, str, Optional[str]]]] = None
+        self._unsaved = 0
+        self._unsaved_since = 0.0
+        self._lock = threading.Lock()
+
+    def _decayed(self, score: float, stamp: float, now: float) -> float:
+        return score * 0.5 ** ((now - stamp) / self.half_life)
+
+    def _make_entry(self, line: str, score: float, stamp: float):
+        shortcut, content = split_entry(line)
+        folded_content = fold(content, self.strip_accents) if content is not None else None
+        return score, stamp, fold(shortcut, self.strip_accents), folded_content
+
+    def _load(self) -> Dict[str, Tuple[float, float, str, Optional[str]]]:
+        # Called with the lock held
+        if self._entries is not None:
+            return self._entries
+        self._entries = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    for line, score, stamp in json.load(f):
+                        self._entries[line] = self._make_entry(line, score, stamp)
+            except Exception as e:
+                print(f"Error loading usage counts: {e}")
+        return self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load())
+
+    def score(self, line: str, now: Optional[float] = None) -> float:
+        with self._lock:
+            entry = self._load().get(line)
+        if entry is None:
+            return 0.0
+        return self._decayed(entry[0], entry[1], time.time() if now is None else now)
+
+    def record(self, line: str, now: Optional[float] = None):
+        """Counts one selection of line."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(line)
+            score = 1.0 + (self._decayed(entry[0], entry[1], now) if entry else 0.0)
+            entries[line] = self._make_entry(line, score, now) if entry is None else (score, now) + entry[2:]
+            if len(entries) > self.max_entries * 1.1:
+                self._evict(now)
+            if not self._unsaved:
+                self._unsaved_since = now
+            self._unsaved += 1
+            due = self._unsaved >= self.flush_every or now - self._unsaved_since >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def _evict(self, now: float):
+        entries = self._entries
+        ranked = sorted(entries, key=lambda line: self._decayed(entries[line][0], entries[line][1], now), reverse=True)
+        for line in ranked[self.max_entries:]:
+            del entries[line]
+
+    def matching(self, words: List[str], prefix: bool = False, now: Optional[float] = None) -> List[Tuple[int, float, str]]:
+        """
+        Returns (tier, score, line) for the recorded lines matching all words,
+        by tier (see match_tier) and then most used first.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            entries = list(self._load().items())
+        found = []
+        for line, (score, stamp, shortcut, content) in entries:
+            tier = match_tier(words, shortcut, content, prefix)
+            if tier is not None:
+                found.append((tier, self._decayed(score, stamp, now), line))
+        found.sort(key=lambda item: (item[0], -item[1]))
+        return found
+
+    def flush(self):
+        """Writes unsaved selections to disk."""
+        with self._lock:
+            if not self._unsaved or not self.path:
+                return
+            rows = [[line, entry[0], entry[1]] for line, entry in self._entries.items()]
+            try:
+                with atomic_write(self.path, encoding='utf-8') as f:
+                    json.dump(rows, f, ensure_ascii=False, separators=(',', ':'))
+                self._unsaved = 0
+            except Exception as e:
+                print(f"Error saving usage counts: {e}")
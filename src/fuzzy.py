@@ -0,0 +1,112 @@
+import re
+from typing import Dict, List, Optional
+
+# Per query word: exact substring, bonus when it starts a word, typo match
+EXACT_SCORE = 3.0
+BOUNDARY_BONUS = 1.0
+TYPO_SCORE = 2.0
+TYPO_PENALTY = 0.75
+
+_TOKEN = re.compile(r'\w+')
+
+
+def max_typos(word: str) -> int:
+    """How many edits a query word may be off by."""
+    if len(word) < 3:
+        return 0
+    return 1 if len(word) < 7 else 2
+
+
+def prefix_distance(word: str, token: str, limit: int) -> int:
+    """
+    Smallest edit distance (with transpositions) between word and a prefix of
+    token, so a word still being typed matches the token it starts.
+    Returns limit + 1 as soon as the distance is known to exceed limit.
+    """
+    token = token[:len(word) + limit]
+    n, m = len(word), len(token)
+    if m < n - limit:
+        return limit + 1
+
+    # Only cells within limit of the diagonal can stay within limit
+    far = limit + 1
+    before = None
+    previous = [j if j <= limit else far for j in range(m + 1)]
+    for i in range(1, n + 1):
+        current = [far] * (m + 1)
+        if i <= limit:
+            current[0] = i
+        char = word[i - 1]
+        for j in range(max(1, i - limit), min(m, i + limit) + 1):
+            cost = 0 if char == token[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and char == token[j - 2] and word[i - 2] == token[j - 1]:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+        if min(current) > limit:
+            return far
+        before, previous = previous, current
+
+    return min(min(previous[max(0, n - limit):]), far)
+
+
+def word_score(word: str, text: str, tokens: List[str], distances: Optional[Dict[str, int]] = None) -> float:
+    """
+    Scores one query word against a text; 0 means it does not match.
+    distances caches the word's distance to tokens already seen, which pays
+    off when many texts are scored for the same query.
+    """
+    pos = text.find(word)
+    if pos >= 0:
+        at_boundary = pos == 0 or not text[pos - 1].isalnum()
+        return EXACT_SCORE + (BOUNDARY_BONUS if at_boundary else 0.0)
+
+    limit = max_typos(word)
+    if not limit:
+        return 0.0
+    if distances is None:
+        distances = {}
+    pairs = None
+    best = limit + 1
+    for token in tokens:
+        distance = distances.get(token)
+        if distance is None:
+            if pairs is None:
+                pairs = {word[i:i + 2] for i in range(len(word) - 1)}
+                # One edit changes at most three letter pairs
+                needed = max(1, len(pairs) - 3 * limit)
+            head = token[:len(word) + limit]
+            # Cheap checks first: a typo keeps the length and most letter pairs
+            if len(token) < len(word) - limit or sum(pair in head for pair in pairs) < needed:
+                distance = limit + 1
+            else:
+                distance = prefix_distance(word, token, limit)
+            distances[token] = distance
+        if distance < best:
+            best = distance
+            if best == 1:
+                # 0 would have been an exact match
+                break
+    if best > limit:
+        return 0.0
+    return TYPO_SCORE - best * TYPO_PENALTY
+
+
+def text_score(words: List[str], text: Optional[str], distances: Optional[Dict[str, Dict[str, int]]] = None) -> float:
+    """
+    Average word score of text, or 0 if any word does not match at all.
+    distances maps each word to its word_score cache.
+    """
+    if not text:
+        return 0.0
+    tokens = None
+    total = 0.0
+    for word in words:
+        if word not in text and tokens is None:
+            tokens = _TOKEN.findall(text)
+        cache = distances.setdefault(word, {}) if distances is not None else None
+        score = word_score(word, text, tokens or [], cache)
+        if not score:
+            return 0.0
+        total += score
+    return total / len(words)
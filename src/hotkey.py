@@ -1,17 +1,49 @@
 from pynput import keyboard
 from PyQt6.QtCore import QObject, pyqtSignal
-import threading
+from src.metrics import tracer
+import time
+
+DEFAULT_HOTKEY = '<ctrl>+<alt>+f'
 
 class HotkeyListener(QObject):
+    """
+    A single global keyboard hook serving every registered hotkey and Escape.
+
+    The hook sees every key typed in any application, so its callbacks do as
+    little as possible: feed the key to the few registered hotkeys and, only
+    while the overlay is visible (see set_escape_armed), check for Escape.
+    stats() reports how many callbacks ran and how long they took.
+    """
     # Signal to be emitted when hotkey is pressed
     activated = pyqtSignal()
     escape_pressed = pyqtSignal()
 
-    def __init__(self):
+    def __init__(self, hotkey: str = DEFAULT_HOTKEY):
         super().__init__()
-        self.hotkeys = None
+        self.hotkey = hotkey
         self.listener = None
         self.running = False
+        self.escape_armed = False
+        # combination -> keyboard.HotKey. Replaced rather than edited, so the
+        # hook thread can walk it without a lock.
+        self._hotkeys = {}
+        self.callbacks = 0
+        self.callback_seconds = 0.0
+        self.register(hotkey, self.on_activate)
+
+    def register(self, combination: str, callback):
+        """
+        Calls callback, on the hook thread, whenever combination (e.g.
+        '<ctrl>+<shift>+k') is pressed. Raises ValueError if it does not parse.
+        """
+        hotkeys = dict(self._hotkeys)
+        hotkeys[combination] = keyboard.HotKey(keyboard.HotKey.parse(combination), callback)
+        self._hotkeys = hotkeys
+
+    def unregister(self, combination: str):
+        hotkeys = dict(self._hotkeys)
+        hotkeys.pop(combination, None)
+        self._hotkeys = hotkeys
 
     def start(self):
         """Starts the global hotkey listener."""
@@ -19,32 +51,52 @@ class HotkeyListener(QObject):
             return
 
         self.running = True
-        # Define the hotkey combination
-        # <ctrl>+<alt>+f
-        self.hotkeys = keyboard.GlobalHotKeys({
-            '<ctrl>+<alt>+f': self.on_activate
-        })
-        
-        # Start the listener for ESC
-        self.listener = keyboard.Listener(on_press=self.on_press)
-        
-        # Start the listeners in non-blocking way
-        self.hotkeys.start()
+        self.listener = keyboard.Listener(on_press=self.on_press, on_release=self.on_release)
+        # Start the listener in non-blocking way
         self.listener.start()
 
     def stop(self):
         """Stops the listener."""
-        if self.hotkeys:
-            self.hotkeys.stop()
         if self.listener:
             self.listener.stop()
         self.running = False
 
+    def set_escape_armed(self, armed: bool):
+        """Escape is only reported while armed, i.e. while the overlay is shown."""
+        self.escape_armed = armed
+
+    def stats(self) -> dict:
+        """Callbacks run by the hook so far and the time spent in them."""
+        callbacks = self.callbacks
+        return {
+            'callbacks': callbacks,
+            'total_ms': self.callback_seconds * 1000,
+            'mean_us': self.callback_seconds * 1e6 / callbacks if callbacks else 0.0,
+        }
+
     def on_activate(self):
         """Callback when hotkey is pressed."""
+        tracer.begin('hotkey')
         # Emit signal to main thread
         self.activated.emit()
 
     def on_press(self, key):
-        if key == keyboard.Key.esc:
+        start = time.perf_counter()
+        if self.escape_armed and key == keyboard.Key.esc:
             self.escape_pressed.emit()
+        key = self.listener.canonical(key)
+        for hotkey in self._hotkeys.values():
+            hotkey.press(key)
+        self._count(start)
+
+    def on_release(self, key):
+        start = time.perf_counter()
+        key = self.listener.canonical(key)
+        for hotkey in self._hotkeys.values():
+            hotkey.release(key)
+        self._count(start)
+
+    def _count(self, start: float):
+        # Only the hook thread writes these
+        self.callbacks += 1
+        self.callback_seconds += time.perf_counter() - start
@@ -0,0 +1,583 @@
+import array
+import heapq
+import unicodedata
+import zlib
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain, islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from src.fuzzy import text_score
+from src import scan
+from src.packed import PackedPostings, PackedStrings
+from src.store import FileState
+
+SEPARATOR = '||'
+GRAM_SIZE = 3
+
+# Column ids, in the order they are searched
+SHORTCUT = 0
+CONTENT = 1
+
+# Search modes: substrings in file order, the same with shortcuts starting
+# with a single-word query first, or typo-tolerant and ranked
+EXACT = 'exact'
+PREFIX = 'prefix'
+FUZZY = 'fuzzy'
+MODES = (EXACT, PREFIX, FUZZY)
+
+# Added to the score of entries matched through their shortcut
+SHORTCUT_BONUS = 0.5
+
+# With NumPy, a vectorized scan beats checking trigram candidates one by one
+# once they are more than this share of a corpus at least SCAN_MIN_ENTRIES big
+SCAN_MIN_ENTRIES = 20000
+SCAN_RATIO = 0.2
+
+# Entries added since the shortcuts were sorted are checked one by one, until
+# there are more than this many (or a 64th of the index) and they get sorted in
+SORT_SLACK = 1024
+# Shortcuts starting with a prefix are listed by sorting their ids, up to this
+# many; past it, finding them in the packed texts in file order is quicker
+PREFIX_SORT_MAX = 4096
+
+
+# Letters that read as a plain one but do not decompose into it
+_BASE_LETTERS = str.maketrans({'đ': 'd', 'ð': 'd', 'ħ': 'h', 'ı': 'i', 'ł': 'l', 'ø': 'o', 'ŧ': 't'})
+
+
+def fold(text: str, strip_accents: bool = True) -> str:
+    """
+    Normalizes text the same way for entries and queries: compatibility
+    forms (NFKC), case and, with strip_accents, accents ("Cà phê" -> "ca phe").
+    """
+    if text.isascii():
+        return text.lower()
+    text = unicodedata.normalize('NFKC', text).casefold()
+    if strip_accents:
+        text = ''.join(char for char in unicodedata.normalize('NFD', text) if not unicodedata.combining(char))
+        text = text.translate(_BASE_LETTERS)
+    # Casefolding and stripping can leave decomposed sequences behind
+    return unicodedata.normalize('NFC', text)
+
+
+def split_entry(line: str):
+    """
+    Splits a line into its (shortcut, content) parts.
+    Lines without "||" have no separate content: the whole line is the shortcut.
+    """
+    if SEPARATOR in line:
+        shortcut, content = line.split(SEPARATOR, 1)
+        return shortcut.strip(), content.strip()
+    return line, None
+
+
+def match_tier(words: List[str], shortcut: str, content: Optional[str], prefix: bool = False) -> Optional[int]:
+    """
+    Where an entry with these folded texts ranks among the tiers of
+    SearchIndex.tiers: 0 when prefix and its shortcut starts with the single
+    word, 1 when its shortcut has every word, 2 when its content does.
+    None if it does not match.
+    """
+    if prefix and len(words) == 1 and shortcut.startswith(words[0]):
+        return 0
+    if all(word in shortcut for word in words):
+        return 1
+    if content is not None and all(word in content for word in words):
+        return 2
+    return None
+
+
+def line_tier(line: str, words: List[str], prefix: bool = False, strip_accents: bool = True) -> Optional[int]:
+    """match_tier of a line."""
+    shortcut, content = split_entry(line)
+    folded_content = fold(content, strip_accents) if content is not None else None
+    return match_tier(words, fold(shortcut, strip_accents), folded_content, prefix)
+
+
+def grams(text: str):
+    """Returns the set of trigrams in text."""
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def _contains(posting: Sequence[int], entry_id: int) -> bool:
+    pos = bisect_left(posting, entry_id)
+    return pos < len(posting) and posting[pos] == entry_id
+
+
+def _lower_bound(order: Sequence[int], texts: PackedStrings, key: bytes) -> int:
+    """First position in order whose text is not below key."""
+    lo, hi = 0, len(order)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if texts.raw(order[mid]) < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class SearchIndex:
+    """
+    Pre-parsed view of the keyword corpus.
+
+    Every entry gets an id in insertion order, so walking ids in ascending
+    order keeps the file's ranking. Both columns (shortcut, content) store the
+    folded text (see fold) per id plus a trigram -> sorted ids posting list used to
+    narrow down candidates before the substring check. The ids are also kept
+    sorted by folded shortcut, so the shortcuts starting with a word are one
+    binary search away.
+
+    Texts are packed into UTF-8 buffers rather than kept as Python strings,
+    and an index loaded from a snapshot reads them straight from the mapped
+    file, so only the pages a search touches become resident. Original lines
+    are decoded only for the results being shown.
+
+    Entries are never moved: removed ones are flagged in place and lines
+    inserted later get new ids at the end, so concurrent readers always see
+    consistent lists. Lines inserted before existing ones leave the ids out
+    of file order (in_order is False): those ids are kept in moved, every id
+    gets a rank that sorts like its file position, and results put the moved
+    ids back in place by rank until the index is rebuilt.
+    """
+
+    def __init__(self, lines=(), postings: bool = True, strip_accents: bool = True):
+        # Without postings every search is a scan: cheaper to build and smaller
+        self.indexed = postings
+        # Queries must be folded the same way, through self.fold
+        self.strip_accents = strip_accents
+        self.displays = PackedStrings()
+        self.columns = (PackedStrings(), PackedStrings())
+        self.postings = (PackedPostings(), PackedPostings())
+        # Ids of the file's lines, in file order
+        self.lines = array.array('I')
+        # 1 for every removed id
+        self.deleted = bytearray()
+        self.removed = 0
+        # False once lines were inserted before existing ones: ids no longer follow the file
+        self.in_order = True
+        # Once not in order: a rank per id sorting like the file positions,
+        # and the ids inserted out of order
+        self.rank = None
+        self.moved = set()
+        # FileState of the keyword file this index reflects, if any
+        self.source = None
+        # Ids below len(order), sorted by folded shortcut; later ones are unsorted
+        self.order = array.array('I')
+        # crc32 of each line << 32 | its id, sorted, to find a line without
+        # searching the texts; keys of the ids added since are unsorted
+        self.line_keys = array.array('Q')
+        self.new_line_keys = array.array('Q')
+        for line in lines:
+            self.add(line)
+        self.sort_shortcuts()
+        self.sort_line_keys()
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __contains__(self, line: str) -> bool:
+        return self.find(line) is not None
+
+    def fold(self, text: str) -> str:
+        """Folds a query the way the entries were."""
+        return fold(text, self.strip_accents)
+
+    def find(self, line: str) -> Optional[int]:
+        """Returns the id of the entry holding exactly line, if there is one."""
+        raw = line.encode('utf-8')
+        crc = zlib.crc32(raw)
+        keys = self.line_keys
+        pos = bisect_left(keys, crc << 32)
+        ids = []
+        while pos < len(keys) and keys[pos] >> 32 == crc:
+            ids.append(keys[pos] & 0xFFFFFFFF)
+            pos += 1
+        ids += [key & 0xFFFFFFFF for key in self.new_line_keys if key >> 32 == crc]
+        for entry_id in ids:
+            if not self.deleted[entry_id] and self.displays.raw(entry_id) == raw:
+                return entry_id
+        return None
+
+    def file_line(self, position: int) -> str:
+        """Returns the indexed line at position in file order."""
+        return self.displays[self.lines[position]]
+
+    def file_lines(self) -> List[str]:
+        """Returns the indexed lines in file order."""
+        displays = self.displays
+        return [displays[entry_id] for entry_id in self.lines]
+
+    def add(self, line: str) -> int:
+        """Adds a line after the existing ones and returns its id."""
+        rank = None
+        if self.rank is not None:
+            rank = self.rank[self.lines[-1]] + 1 if self.lines else 0.0
+        entry_id = self._insert(line, rank)
+        self.lines.append(entry_id)
+        return entry_id
+
+    def replace(self, start: int, end: int, lines: List[str]):
+        """Replaces the file lines [start:end] with lines."""
+        inserted = bool(lines) and end < len(self.lines)
+        if inserted and self.rank is None:
+            self._number_lines()
+        ranks = self._ranks(start, end, len(lines)) if self.rank is not None else [None] * len(lines)
+        for entry_id in self.lines[start:end]:
+            self._remove(entry_id)
+        ids = array.array('I', (self._insert(line, rank) for line, rank in zip(lines, ranks)))
+        if inserted:
+            self.moved.update(ids)
+            self.in_order = False
+        self.lines[start:end] = ids
+
+    def _number_lines(self):
+        """Ranks every line by its file position."""
+        rank = self.rank
+        if rank is None:
+            rank = array.array('d', bytes(8 * len(self.deleted)))
+        for position, entry_id in enumerate(self.lines):
+            rank[entry_id] = position
+        self.rank = rank
+
+    def _ranks(self, start: int, end: int, count: int) -> List[float]:
+        """Ranks for count lines replacing the file lines [start:end], between their neighbours."""
+        lines = self.lines
+        for _ in range(2):
+            low = self.rank[lines[start - 1]] if start else None
+            high = self.rank[lines[end]] if end < len(lines) else None
+            if high is None:
+                low = -1.0 if low is None else low
+                high = low + count + 1
+            elif low is None:
+                low = high - count - 1
+            step = (high - low) / (count + 1)
+            ranks = [low + step * (i + 1) for i in range(count)]
+            if all(a < b for a, b in zip([low] + ranks, ranks + [high])):
+                return ranks
+            # Too many inserts at one spot for the float precision: start the ranks over
+            self._number_lines()
+        return ranks
+
+    def dedupe(self):
+        """Drops lines that repeat an earlier one."""
+        seen = set()
+        keep = array.array('I')
+        for entry_id in self.lines:
+            display = self.displays[entry_id]
+            if display in seen:
+                self._remove(entry_id)
+            else:
+                seen.add(display)
+                keep.append(entry_id)
+        self.lines = keep
+
+    def _remove(self, entry_id: int):
+        self.deleted[entry_id] = 1
+        self.removed += 1
+
+    def _insert(self, line: str, rank: float = None) -> int:
+        entry_id = len(self.deleted)
+        shortcut, content = split_entry(line)
+        # Hidden from concurrent readers until both columns are in place
+        self.deleted.append(1)
+        if self.rank is not None:
+            self.rank.append(rank)
+        self.displays.append(line)
+        self.new_line_keys.append(zlib.crc32(line.encode('utf-8')) << 32 | entry_id)
+        self._add_text(SHORTCUT, entry_id, self.fold(shortcut))
+        self._add_text(CONTENT, entry_id, self.fold(content) if content is not None else '')
+        self.deleted[entry_id] = 0
+        return entry_id
+
+    def _add_text(self, column: int, entry_id: int, text: str):
+        self.columns[column].append(text)
+        if not text or not self.indexed:
+            return
+        postings = self.postings[column].extra
+        for gram in grams(text):
+            posting = postings.get(gram)
+            if posting is None:
+                posting = postings[gram] = array.array('I')
+            posting.append(entry_id)
+
+    def sort_shortcuts(self):
+        """Sorts every id by folded shortcut, for prefix_ids."""
+        shortcuts = self.columns[SHORTCUT]
+        # UTF-8 bytes sort like the code points they encode
+        self.order = array.array('I', sorted(range(len(shortcuts)), key=shortcuts.raw))
+
+    def sort_line_keys(self):
+        """Sorts the keys of the lines added since in with the others, for find."""
+        self.line_keys = array.array('Q', sorted(chain(self.line_keys, self.new_line_keys)))
+        self.new_line_keys = array.array('Q')
+
+    def refresh_order(self):
+        """Sorts the shortcuts and line keys again once many entries were added unsorted."""
+        unsorted = len(self.columns[SHORTCUT]) - len(self.order)
+        if unsorted > max(SORT_SLACK, len(self.order) // 64):
+            self.sort_shortcuts()
+        if len(self.new_line_keys) > max(SORT_SLACK, len(self.line_keys) // 64):
+            self.sort_line_keys()
+
+    def to_sections(self) -> Tuple[List[Tuple[str, Sequence]], dict]:
+        """
+        Returns the named buffers (a section may be a list of buffers written
+        back to back) and the small metadata that from_buffer needs.
+        """
+        sections = []
+        for name, strings in (('displays', self.displays), ('shortcut', self.columns[SHORTCUT]),
+                              ('content', self.columns[CONTENT])):
+            blob, offsets = strings.pack()
+            sections += [(name + '.blob', blob), (name + '.offsets', offsets)]
+        for column, postings in enumerate(self.postings):
+            keys, key_offsets, starts, chunks, table = postings.pack()
+            name = f"postings{column}"
+            sections += [(name + '.keys', keys), (name + '.key_offsets', key_offsets),
+                         (name + '.starts', starts), (name + '.ids', chunks), (name + '.table', table)]
+        line_keys = self.line_keys
+        if self.new_line_keys:
+            line_keys = array.array('Q', sorted(chain(line_keys, self.new_line_keys)))
+        sections += [('lines', self.lines), ('deleted', self.deleted), ('order', self.order),
+                     ('line_keys', line_keys)]
+        if self.rank is not None:
+            sections += [('rank', self.rank), ('moved', array.array('I', sorted(self.moved)))]
+        meta = {'removed': self.removed, 'in_order': self.in_order, 'source': tuple(self.source) if self.source else None,
+                'indexed': self.indexed, 'strip_accents': self.strip_accents}
+        return sections, meta
+
+    @classmethod
+    def from_buffer(cls, buffer, sections: Dict[str, Tuple[int, int]], meta: dict) -> 'SearchIndex':
+        """
+        Rebuilds an index over buffer (e.g. a mapped snapshot) without copying
+        the texts or postings; sections maps names to (offset, length).
+        """
+        view = memoryview(buffer)
+
+        def typed(name: str, typecode: str):
+            offset, length = sections[name]
+            return view[offset:offset + length].cast(typecode)
+
+        def strings(blob: str, offsets: str) -> PackedStrings:
+            return PackedStrings(buffer, typed(offsets, 'Q'), origin=sections[blob][0])
+
+        index = cls(postings=meta['indexed'], strip_accents=meta['strip_accents'])
+        index.displays = strings('displays.blob', 'displays.offsets')
+        index.columns = (strings('shortcut.blob', 'shortcut.offsets'), strings('content.blob', 'content.offsets'))
+        index.postings = tuple(
+            PackedPostings(strings(f"postings{column}.keys", f"postings{column}.key_offsets"),
+                           typed(f"postings{column}.starts", 'Q'), typed(f"postings{column}.ids", 'I'),
+                           typed(f"postings{column}.table", 'I'))
+            for column in (SHORTCUT, CONTENT))
+        # Replaced rather than edited, so these can stay mapped
+        index.order = typed('order', 'I')
+        index.line_keys = typed('line_keys', 'Q')
+        # Small and edited in place, so these are copied
+        index.lines = array.array('I', typed('lines', 'I'))
+        index.deleted = bytearray(typed('deleted', 'B'))
+        index.removed = meta['removed']
+        index.in_order = meta['in_order']
+        if 'rank' in sections:
+            index.rank = array.array('d', typed('rank', 'd'))
+            index.moved = set(typed('moved', 'I'))
+        index.source = FileState(*meta['source']) if meta['source'] else None
+        return index
+
+    def candidates(self, column: int, words: List[str]) -> Optional[Sequence[int]]:
+        """
+        Returns the sorted ids whose text contains every trigram of the words,
+        or None when the words are too short to narrow anything down.
+        """
+        if not self.indexed:
+            return None
+        postings = self.postings[column]
+        lists = []
+        for gram in set().union(*(grams(word) for word in words)):
+            posting = postings.get(gram)
+            if posting is None:
+                return []
+            lists.append(posting)
+        if not lists:
+            return None
+
+        # Intersect the smallest lists first so the working set shrinks fast
+        lists.sort(key=len)
+        result = lists[0]
+        for posting in lists[1:]:
+            if len(result) * 16 < len(posting):
+                result = [i for i in result if _contains(posting, i)]
+            else:
+                keep = set(result)
+                result = [i for i in posting if i in keep]
+            if not result:
+                break
+        return result
+
+    def candidate_bound(self, column: int, words: List[str]) -> Optional[int]:
+        """
+        An upper bound on len(candidates(column, words)) without intersecting
+        anything: the length of the shortest posting list. None like candidates.
+        """
+        if not self.indexed:
+            return None
+        postings = self.postings[column]
+        bound = None
+        for gram in set().union(*(grams(word) for word in words)):
+            posting = postings.get(gram)
+            if posting is None:
+                return 0
+            bound = len(posting) if bound is None else min(bound, len(posting))
+        return bound
+
+    def iter_matches(self, column: int, words: List[str], within: Optional[Sequence[int]] = None) -> Iterator[int]:
+        """
+        Yields, in file order, the ids whose column text contains all words.
+        When within is given only those ids are checked.
+        """
+        texts = self.columns[column]
+        deleted = self.deleted
+        needles = [word.encode('utf-8') for word in words]
+        if within is not None:
+            # Already in file order
+            for entry_id in within:
+                if not deleted[entry_id] and texts.contains(entry_id, needles):
+                    yield entry_id
+            return
+        ids = self.candidates(column, words)
+        if ids is None or self._prefer_scan(len(ids)):
+            # Nothing (or too little) to go by: scan the packed text itself
+            matches = (entry_id for entry_id in scan.scan_ids(texts, needles) if not deleted[entry_id])
+        else:
+            matches = (entry_id for entry_id in ids if not deleted[entry_id] and texts.contains(entry_id, needles))
+        yield from self._in_file_order(matches, lambda entry_id: texts.contains(entry_id, needles))
+
+    def _in_file_order(self, ids: Iterable[int], matches: Callable[[int], bool]) -> Iterable[int]:
+        """
+        Puts ids, listed by id, in file order: the moved ids among them (those
+        for which matches is true) are merged back in by rank.
+        """
+        if self.in_order:
+            return ids
+        rank, moved, deleted = self.rank, self.moved, self.deleted
+        placed = sorted((entry_id for entry_id in list(moved) if not deleted[entry_id] and matches(entry_id)),
+                        key=rank.__getitem__)
+        rest = (entry_id for entry_id in ids if not deleted[entry_id] and entry_id not in moved)
+        return heapq.merge(rest, placed, key=rank.__getitem__)
+
+    def _prefer_scan(self, candidate_count: int) -> bool:
+        size = len(self.deleted)
+        return scan.AVAILABLE and size >= SCAN_MIN_ENTRIES and candidate_count > size * SCAN_RATIO
+
+    def match_ids(self, column: int, words: List[str], within: Optional[Sequence[int]] = None) -> Sequence[int]:
+        """Returns every id matching all words, as a compact array."""
+        return array.array('I', self.iter_matches(column, words, within))
+
+    def iter_lines(self, id_lists) -> Iterator[str]:
+        """Yields the distinct lines of the id lists, in order."""
+        seen = set()
+        deleted = self.deleted
+        for ids in id_lists:
+            for entry_id in ids:
+                # Removed while we were looking at it
+                if deleted[entry_id]:
+                    continue
+                display = self.displays[entry_id]
+                if display in seen:
+                    continue
+                seen.add(display)
+                yield display
+
+    def tiers(self, words: List[str], prefix: bool = False) -> List[Iterable[int]]:
+        """
+        Lazily lists the ids matching all words, in the order they rank:
+        shortcut matches, then content matches. With prefix, a single word
+        first gets the ids whose shortcut starts with it.
+        """
+        tiers = [self.iter_matches(column, words) for column in (SHORTCUT, CONTENT)]
+        if prefix and len(words) == 1:
+            tiers.insert(0, self.prefix_ids(words[0]))
+        return tiers
+
+    def iter_search(self, words: List[str]) -> Iterator[str]:
+        """Lazily yields every matching line, shortcut matches first."""
+        return self.iter_lines(self.tiers(words))
+
+    def search(self, words: List[str], limit: int) -> List[str]:
+        """Returns up to limit matching lines, shortcut matches first."""
+        return list(islice(self.iter_search(words), limit))
+
+    def prefix_ids(self, prefix: str) -> Iterable[int]:
+        """Returns, in file order, the ids whose folded shortcut starts with prefix."""
+        shortcuts = self.columns[SHORTCUT]
+        order = self.order
+        key = prefix.encode('utf-8')
+        lo = _lower_bound(order, shortcuts, key)
+        # 0xff never occurs in UTF-8, so this is past every text starting with key
+        hi = _lower_bound(order, shortcuts, key + b'\xff')
+        if hi - lo > PREFIX_SORT_MAX:
+            # Common enough that walking the texts finds the first ones sooner
+            ids = shortcuts.find_prefix_ids(key)
+        else:
+            ids = sorted(order[lo:hi])
+            for entry_id in range(len(order), len(shortcuts)):
+                if shortcuts.raw(entry_id).startswith(key):
+                    ids.append(entry_id)
+        return self._in_file_order(ids, lambda entry_id: shortcuts.raw(entry_id).startswith(key))
+
+    def fuzzy_search(self, words: List[str], limit: int, max_candidates: int = 300) -> List[str]:
+        """Returns up to limit lines ranked by typo-tolerant score, best first."""
+        return [line for _, line in self.fuzzy_scored(words, limit, max_candidates)]
+
+    def fuzzy_scored(self, words: List[str], limit: int, max_candidates: int = 300) -> List[Tuple[float, str]]:
+        """
+        Returns up to limit (score, line) pairs, best first, for fuzzy_search.
+
+        Candidates are the entries sharing the most trigrams with the query, so
+        scoring only runs on max_candidates entries. Trigrams found in more
+        than a tenth of the corpus are skipped while rarer ones exist: they
+        cost the most to count and say the least.
+        """
+        if limit <= 0:
+            return []
+        query_grams = set().union(*(grams(word) for word in words))
+        if not query_grams or not self.indexed:
+            # Nothing to be fuzzy about in words this short, or nothing to
+            # pick candidates with
+            return [(0.0, line) for line in self.search(words, limit)]
+
+        lists = [posting for postings in self.postings for gram in query_grams
+                 for posting in (postings.get(gram),) if posting is not None]
+        if not lists:
+            return []
+        common = max(1000, len(self.displays) // 10)
+        rare = [posting for posting in lists if len(posting) <= common]
+        shared = Counter()
+        for posting in rare or [min(lists, key=len)]:
+            shared.update(posting)
+
+        # Bounded min-heap of (score, -id): the root is the worst kept
+        best = []
+        distances = {}
+        shortcuts, contents = self.columns
+        for entry_id, _ in shared.most_common(max_candidates):
+            if self.deleted[entry_id]:
+                continue
+            score = text_score(words, shortcuts[entry_id], distances)
+            if score:
+                score += SHORTCUT_BONUS
+            score = max(score, text_score(words, contents[entry_id], distances))
+            if not score:
+                continue
+            item = (score, -entry_id)
+            if len(best) < limit:
+                heapq.heappush(best, item)
+            elif item > best[0]:
+                heapq.heapreplace(best, item)
+
+        scored = []
+        seen = set()
+        for score, entry_id in sorted(best, reverse=True):
+            display = self.displays[-entry_id]
+            if display not in seen:
+                seen.add(display)
+                scored.append((score, display))
+        return scored
@@ -0,0 +1,179 @@
+"""
+Local query API for the running instance.
+
+Other tools (scripts, shell completions, editor plugins) connect to a Unix
+domain socket next to the singleton lock file and send one JSON object per
+line:
+
+    {"query": "deploy", "limit": 5, "mode": "exact"}
+    {"queries": ["deploy", "kubectl get"], "limit": 5}
+
+Each request gets one JSON line back, {"results": [...]} for a single query
+or {"results": [[...], [...]]} for a batch, or {"error": "..."}. An "id"
+field is echoed back. Connections stay open for further requests, so a
+client that keeps its connection pays no setup per query.
+"""
+import json
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+from typing import List, Optional
+
+from src.index import EXACT, MODES
+
+LOCK_NAME = 'find_box_auto_suggest.lock'
+# Unix sockets are missing on older Windows builds of Python
+AVAILABLE = hasattr(socket, 'AF_UNIX')
+
+
+def socket_path(lock_path: str) -> str:
+    """The socket lives next to the lock file that marks the running instance."""
+    return lock_path + '.sock'
+
+
+def default_socket_path() -> str:
+    return socket_path(os.path.join(tempfile.gettempdir(), LOCK_NAME))
+
+
+def handle_request(search_engine, request: dict) -> dict:
+    """Answers one decoded request."""
+    limit = request.get('limit', 10)
+    mode = request.get('mode', EXACT)
+    # JSON true/false would pass as the ints 1 and 0
+    if not isinstance(limit, int) or isinstance(limit, bool) or limit < 0:
+        return {'error': "limit must be a non-negative integer"}
+    if mode not in MODES:
+        return {'error': f"unknown mode {mode!r}"}
+
+    if 'queries' in request:
+        queries = request['queries']
+        if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+            return {'error': "queries must be a list of strings"}
+        return {'results': [search_engine.search(query, limit, mode) for query in queries]}
+    if isinstance(request.get('query'), str):
+        return {'results': search_engine.search(request['query'], limit, mode)}
+    return {'error': "expected a query string or a queries list"}
+
+
+class _QueryHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            if not raw.strip():
+                continue
+            request_id = None
+            try:
+                request = json.loads(raw)
+                if not isinstance(request, dict):
+                    raise ValueError("request must be a JSON object")
+                request_id = request.get('id')
+                response = handle_request(self.server.search_engine, request)
+            except ValueError as e:
+                response = {'error': f"bad request: {e}"}
+            except Exception as e:
+                print(f"Query server error: {e}")
+                response = {'error': str(e)}
+            if request_id is not None:
+                response['id'] = request_id
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+if AVAILABLE:
+    class _Server(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+class QueryServer:
+    """
+    Serves a SearchEngine on a Unix domain socket from background threads.
+    Searches use the engine's live index, so reloads show up immediately.
+    """
+
+    def __init__(self, search_engine, path: str):
+        self.search_engine = search_engine
+        self.path = path
+        self._server = None
+        self._thread = None
+
+    def start(self) -> bool:
+        """Starts listening; returns False where Unix sockets are unavailable."""
+        if not AVAILABLE:
+            print("Query server not available on this platform.")
+            return False
+        # Only the instance holding the lock gets here, so a leftover socket is stale
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        server = _Server(self.path, _QueryHandler)
+        try:
+            os.chmod(self.path, 0o600)
+        except OSError:
+            server.server_close()
+            raise
+        server.search_engine = self.search_engine
+        # Set only once it can serve, so stop() never waits on a server that never ran
+        self._server = server
+        self._thread = threading.Thread(target=self._server.serve_forever, name="FindBoxQueryServer", daemon=True)
+        self._thread.start()
+        print(f"Query server listening on {self.path}")
+        return True
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class QueryClient:
+    """
+    Connection to a running instance's query server. Keep one open to
+    avoid connecting per query.
+
+        with QueryClient() as client:
+            client.search("deploy", limit=5)
+    """
+
+    def __init__(self, path: Optional[str] = None, timeout: Optional[float] = 5.0):
+        if not AVAILABLE:
+            raise OSError("Unix domain sockets are not available on this platform")
+        self.path = path or default_socket_path()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        self._socket.connect(self.path)
+        self._file = self._socket.makefile('rwb')
+
+    def request(self, request: dict) -> dict:
+        self._file.write(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._file.flush()
+        raw = self._file.readline()
+        if not raw:
+            raise ConnectionError("query server closed the connection")
+        response = json.loads(raw)
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
+
+    def search(self, query: str, limit: int = 10, mode: str = EXACT) -> List[str]:
+        return self.request({'query': query, 'limit': limit, 'mode': mode})['results']
+
+    def search_many(self, queries: List[str], limit: int = 10, mode: str = EXACT) -> List[List[str]]:
+        return self.request({'queries': queries, 'limit': limit, 'mode': mode})['results']
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+class LatencyTracer:
+    """
+    Opt-in timing of end-to-end events such as "keystroke" (textEdited to the
+    resized result list) or "hotkey" (Ctrl+Alt+F to a usable overlay).
+
+    An event is started with begin(), every mark() records the time spent
+    since the previous mark as a stage, and end() adds the stages and the
+    total to rolling histograms. Events slower than slow_ms are printed with
+    their stage breakdown. Marks may come from any thread. When disabled,
+    every call returns immediately.
+    """
+
+    def __init__(self, enabled: bool = False, slow_ms: Optional[float] = None, window: int = 1000):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.window = window
+        self.histograms: Dict[str, Deque[float]] = {}
+        self.dropped = 0
+        # event -> (start time, [(stage, time)])
+        self._active: Dict[str, Tuple[float, List[Tuple[str, float]]]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'LatencyTracer':
+        """Configured by FINDBOX_TRACE=1 and FINDBOX_TRACE_SLOW_MS=<ms>."""
+        slow_ms = os.environ.get('FINDBOX_TRACE_SLOW_MS')
+        return cls(enabled=os.environ.get('FINDBOX_TRACE', '') not in ('', '0'),
+                   slow_ms=float(slow_ms) if slow_ms else None)
+
+    def begin(self, event: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            # A new keystroke supersedes one that never finished
+            if event in self._active:
+                self.dropped += 1
+            self._active[event] = (time.perf_counter(), [])
+
+    def mark(self, event: str, stage: str):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            active = self._active.get(event)
+            if active is not None:
+                active[1].append((stage, now))
+
+    def end(self, event: str, stage: Optional[str] = None):
+        """Finishes the event, optionally marking a last stage first."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            active = self._active.pop(event, None)
+            if active is None:
+                return
+            start, marks = active
+            if stage:
+                marks.append((stage, now))
+            stages = []
+            previous = start
+            for name, at in marks:
+                stages.append((name, (at - previous) * 1000))
+                previous = at
+            total = (now - start) * 1000
+            for name, ms in stages:
+                self._record(f"{event}.{name}", ms)
+            self._record(f"{event}.total", total)
+
+        if self.slow_ms is not None and total >= self.slow_ms:
+            breakdown = ', '.join(f"{name} {ms:.1f}" for name, ms in stages)
+            print(f"Slow {event}: {total:.1f} ms ({breakdown})")
+
+    def _record(self, key: str, ms: float):
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = deque(maxlen=self.window)
+        histogram.append(ms)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Returns count and p50/p95/p99/max in ms for every recorded stage."""
+        with self._lock:
+            samples = {key: sorted(values) for key, values in self.histograms.items()}
+        return {
+            key: {
+                'count': len(values),
+                'p50_ms': _percentile(values, 50),
+                'p95_ms': _percentile(values, 95),
+                'p99_ms': _percentile(values, 99),
+                'max_ms': values[-1],
+            }
+            for key, values in sorted(samples.items()) if values
+        }
+
+    def dump(self, path: Optional[str] = None, counters: Optional[Dict[str, dict]] = None) -> str:
+        """
+        Returns the histograms, plus any counters given, as JSON, also
+        writing them to path if given.
+        """
+        report = {'dropped': self.dropped, 'stages': self.stats()}
+        if counters:
+            report['counters'] = counters
+        text = json.dumps(report, indent=2)
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+        return text
+
+
+# Shared by the UI, the search worker and the hotkey listener
+tracer = LatencyTracer.from_env()
@@ -0,0 +1,199 @@
+import array
+import zlib
+from bisect import bisect_right
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+
+class PackedStrings:
+    """
+    Append-only list of strings stored as UTF-8 in one buffer plus an offsets
+    array, instead of one Python object per string.
+
+    Strings loaded from a snapshot live in that (memory-mapped) buffer, at
+    origin + offsets[i]; strings appended later go to an in-memory tail.
+    Each string is followed by a newline, so searching the whole buffer for
+    a word never matches across two strings. Strings are decoded only when
+    asked for.
+    """
+
+    def __init__(self, buffer=None, offsets: Optional[Sequence[int]] = None, origin: int = 0):
+        self.buffer = buffer
+        self.offsets = offsets if offsets is not None else array.array('Q', [0])
+        self.origin = origin
+        self.base_count = len(self.offsets) - 1
+        self.tail = bytearray()
+        self.tail_offsets = array.array('Q', [0])
+
+    def __len__(self):
+        return self.base_count + len(self.tail_offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        buffer, start, end = self.span(i)
+        return str(buffer[start:end], 'utf-8')
+
+    def raw(self, i: int) -> bytes:
+        buffer, start, end = self.span(i)
+        return bytes(buffer[start:end])
+
+    def span(self, i: int) -> Tuple[object, int, int]:
+        """Returns (buffer, start, end) of string i."""
+        if i < self.base_count:
+            origin = self.origin
+            return self.buffer, origin + self.offsets[i], origin + self.offsets[i + 1] - 1
+        i -= self.base_count
+        return self.tail, self.tail_offsets[i], self.tail_offsets[i + 1] - 1
+
+    def append(self, text: str):
+        self.tail += text.encode('utf-8')
+        self.tail += b'\n'
+        self.tail_offsets.append(len(self.tail))
+
+    def contains(self, i: int, needles: List[bytes]) -> bool:
+        """Whether string i contains every needle (UTF-8 encoded)."""
+        buffer, start, end = self.span(i)
+        for needle in needles:
+            if buffer.find(needle, start, end) < 0:
+                return False
+        return True
+
+    def parts(self):
+        """Returns (buffer, offsets, origin, first index) of the loaded strings and of the tail."""
+        return ((self.buffer, self.offsets, self.origin, 0),
+                (self.tail, self.tail_offsets, 0, self.base_count))
+
+    def find_ids(self, needle: bytes) -> Iterator[int]:
+        """Yields, in order, the indexes of the strings containing needle."""
+        for buffer, offsets, origin, first in self.parts():
+            if len(offsets) < 2:
+                continue
+            pos, end = origin + offsets[0], origin + offsets[-1]
+            while True:
+                pos = buffer.find(needle, pos, end)
+                if pos < 0:
+                    break
+                i = bisect_right(offsets, pos - origin) - 1
+                yield first + i
+                # Continue with the next string
+                pos = origin + offsets[i + 1]
+
+    def find_prefix_ids(self, prefix: bytes) -> Iterator[int]:
+        """Yields, in order, the indexes of the strings starting with prefix."""
+        # Past the first one, every string starts right after a newline
+        needle = b'\n' + prefix
+        for buffer, offsets, origin, first in self.parts():
+            if len(offsets) < 2:
+                continue
+            pos, end = origin + offsets[0], origin + offsets[-1]
+            if buffer[pos:pos + len(prefix)] == prefix:
+                yield first
+            while True:
+                pos = buffer.find(needle, pos, end)
+                if pos < 0:
+                    break
+                pos += 1
+                yield first + bisect_right(offsets, pos - origin) - 1
+
+    def pack(self) -> Tuple[bytes, array.array]:
+        """Returns (blob, offsets) of all strings, offsets relative to the blob."""
+        if not self.base_count:
+            return self.tail, self.tail_offsets
+        start, end = self.origin + self.offsets[0], self.origin + self.offsets[-1]
+        blob = bytes(self.buffer[start:end]) + self.tail
+        base = self.offsets[0]
+        offsets = array.array('Q', (offset - base for offset in self.offsets))
+        size = end - start
+        offsets.extend(size + offset for offset in self.tail_offsets[1:])
+        return blob, offsets
+
+
+# Free slot in a PackedPostings hash table
+EMPTY = 0xFFFFFFFF
+
+
+def _table_size(count: int) -> int:
+    # Power of two, at most half full
+    size = 8
+    while size < count * 2:
+        size *= 2
+    return size
+
+
+class PackedPostings:
+    """
+    Trigram -> sorted ids.
+
+    Grams loaded from a snapshot are packed keys with their ids in slices of
+    one shared uint32 array (no per-gram objects), found through an
+    open-addressing hash table (crc32, linear probing) stored alongside.
+    Ids added afterwards are kept in a small array per gram.
+    """
+
+    def __init__(self, keys: Optional[PackedStrings] = None, starts: Optional[Sequence[int]] = None,
+                 ids: Optional[Sequence[int]] = None, table: Optional[Sequence[int]] = None):
+        self.keys = keys if keys is not None else PackedStrings()
+        self.starts = starts if starts is not None else array.array('Q', [0])
+        self.ids = ids if ids is not None else array.array('I')
+        self.table = table if table is not None else array.array('I')
+        # gram -> array('I') of ids added since loading
+        self.extra = {}
+
+    def _base(self, gram: str) -> Optional[Sequence[int]]:
+        key = gram.encode('utf-8')
+        keys, table = self.keys, self.table
+        buffer, offsets, origin = keys.buffer, keys.offsets, keys.origin
+        mask = len(table) - 1
+        slot = zlib.crc32(key) & mask
+        while True:
+            i = table[slot]
+            if i == EMPTY:
+                return None
+            if buffer[origin + offsets[i]:origin + offsets[i + 1] - 1] == key:
+                return self.ids[self.starts[i]:self.starts[i + 1]]
+            slot = (slot + 1) & mask
+
+    def get(self, gram: str, default=None) -> Optional[Sequence[int]]:
+        base = self._base(gram) if self.keys.base_count else None
+        extra = self.extra.get(gram)
+        if extra is None:
+            return default if base is None else base
+        if base is None:
+            return extra
+        # Added ids are always larger, so the result stays sorted
+        merged = array.array('I', base)
+        merged.extend(extra)
+        return merged
+
+    def pack(self) -> Tuple[bytes, array.array, array.array, List[Sequence[int]], array.array]:
+        """
+        Returns (key blob, key offsets, starts, id chunks, hash table) with the
+        keys in byte order. The ids are the concatenation of the chunks, which
+        are not copied.
+        """
+        keys = PackedStrings()
+        starts = array.array('Q', [0])
+        chunks = []
+        merged = {self.keys.raw(i): i for i in range(self.keys.base_count)}
+        extra = {gram.encode('utf-8'): posting for gram, posting in self.extra.items()}
+        for key in extra:
+            merged.setdefault(key, None)
+
+        table = array.array('I', [EMPTY]) * _table_size(len(merged))
+        mask = len(table) - 1
+        total = 0
+        for number, key in enumerate(sorted(merged)):
+            slot = zlib.crc32(key) & mask
+            while table[slot] != EMPTY:
+                slot = (slot + 1) & mask
+            table[slot] = number
+            i = merged[key]
+            if i is not None:
+                chunks.append(self.ids[self.starts[i]:self.starts[i + 1]])
+                total += self.starts[i + 1] - self.starts[i]
+            posting = extra.get(key)
+            if posting is not None:
+                chunks.append(posting)
+                total += len(posting)
+            keys.tail += key + b'\n'
+            keys.tail_offsets.append(len(keys.tail))
+            starts.append(total)
+        return keys.tail, keys.tail_offsets, starts, chunks, table
@@ -2,17 +2,28 @@ import sys
 import threading
 from PyQt6.QtWidgets import QApplication
 from src.ui import SearchOverlay
-from src.search import SearchEngine
+from src.shards import open_engine
 from src.hotkey import HotkeyListener
 
 class FindBoxPlugin:
-    def __init__(self, data_file="keyword.txt"):
+    def __init__(self, data_file="keyword.txt", shared=True, providers=()):
+        # A keyword file, or a list of files, directories or globs
         self.data_file = data_file
+        # Plugins in several host applications share one index: the first host
+        # builds it, the others map it from the snapshot file
+        self.shared = shared
+        # Extra search sources (see src/providers.py), listed after the keywords
+        self.providers = list(providers)
+        self.search_engine = None
         self.app = None
         self.window = None
         self.listener = None
         self._thread = None
 
+    def add_provider(self, provider):
+        """Adds a search source; call before start()."""
+        self.providers.append(provider)
+
     def start(self):
         """Starts the plugin in a separate thread (if needed) or prepares it."""
         # PyQt needs to run in the main thread usually. 
@@ -24,11 +35,13 @@ class FindBoxPlugin:
         else:
             self.app = QApplication.instance()
 
-        self.search_engine = SearchEngine(self.data_file)
-        self.window = SearchOverlay(self.search_engine)
+        self.search_engine = open_engine(self.data_file, shared=self.shared)
+        self.window = SearchOverlay(self.search_engine, providers=self.providers)
         
         self.listener = HotkeyListener()
         self.listener.activated.connect(self.window.show_search)
+        self.listener.escape_pressed.connect(self.window.hide_if_visible)
+        self.window.visibility_changed.connect(self.listener.set_escape_armed)
         self.listener.start()
         
         print("Find Box Plugin Started. Press Ctrl+Alt+F.")
@@ -41,6 +54,8 @@ class FindBoxPlugin:
     def stop(self):
         if self.listener:
             self.listener.stop()
+        if self.search_engine:
+            self.search_engine.close()
 
 # Example usage:
 # plugin = FindBoxPlugin()
@@ -0,0 +1,295 @@
+"""
+Search sources besides the keyword file, queried side by side.
+
+A provider returns the lines matching a query. FederatedSearch asks every
+provider at once, each on its own pool thread and with its own deadline:
+results are delivered as soon as a provider answers, so a fast source shows
+up while a slow one is still working, and whatever has not answered by its
+deadline is dropped. The keyword search keeps its own worker, so no
+provider can hold back the keystroke path.
+"""
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from itertools import chain, islice
+from typing import Callable, Iterable, List, Sequence
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from PyQt6.QtGui import QGuiApplication
+from src.index import fold
+
+# A provider answering this long after its deadline did not check stop()
+# and its results are dropped
+LATE_GRACE_MS = 20
+
+
+def match_lines(query: str, lines: Iterable[str], limit: int, stop: Callable[[], bool]) -> List[str]:
+    """
+    The first limit lines containing every word of query, ignoring case and
+    accents, lines starting with the first word first. Stops early once stop() is true.
+    """
+    words = fold(query).split()
+    if not words:
+        return []
+    starting, containing = [], []
+    for line in lines:
+        if stop():
+            break
+        folded = fold(line)
+        if all(word in folded for word in words):
+            (starting if folded.startswith(words[0]) else containing).append(line)
+            if len(starting) >= limit:
+                break
+    return (starting + containing)[:limit]
+
+
+class SearchProvider(ABC):
+    """
+    A source of results. search() runs on a pool thread; a provider that may
+    take long should check stop() as it goes and return what it has found
+    once it is true (its deadline passed, or a newer query superseded it).
+    """
+    name = 'provider'
+    deadline_ms = 100
+
+    def start(self):
+        """Called once on the GUI thread before the first search."""
+
+    @abstractmethod
+    def search(self, query: str, limit: int, stop: Callable[[], bool]) -> List[str]:
+        """The first limit lines matching query."""
+
+
+class ClipboardProvider(SearchProvider):
+    """The most recent texts copied to the clipboard, newest first."""
+    name = 'clipboard'
+    deadline_ms = 50
+
+    def __init__(self, max_entries: int = 50, max_length: int = 1000, deadline_ms: int = None):
+        self.entries = deque(maxlen=max_entries)
+        # Longer copies (whole files, logs) are not worth listing
+        self.max_length = max_length
+        self.clipboard = None
+        if deadline_ms is not None:
+            self.deadline_ms = deadline_ms
+
+    def start(self):
+        # A bound method: Qt would not keep a lambda's closure alive
+        self.clipboard = QGuiApplication.clipboard()
+        self.clipboard.dataChanged.connect(self._on_clipboard_changed)
+
+    def _on_clipboard_changed(self):
+        self.add(self.clipboard.text())
+
+    def add(self, text: str):
+        text = text.strip()
+        if not text or len(text) > self.max_length:
+            return
+        if text in self.entries:
+            self.entries.remove(text)
+        self.entries.appendleft(text)
+
+    def search(self, query, limit, stop):
+        # Copied in one step, as the GUI thread keeps adding entries
+        return match_lines(query, list(self.entries), limit, stop)
+
+
+class CommandProvider(SearchProvider):
+    """
+    A list of commands: the lines of a file, or by default the executables
+    on PATH, listed on the first search.
+    """
+    name = 'commands'
+
+    def __init__(self, commands_file: str = None, deadline_ms: int = None):
+        self.commands_file = commands_file
+        self.commands = None
+        self._lock = threading.Lock()
+        if deadline_ms is not None:
+            self.deadline_ms = deadline_ms
+
+    def _load(self) -> List[str]:
+        if self.commands_file:
+            with open(self.commands_file, 'r', encoding='utf-8') as f:
+                return [line.strip() for line in f if line.strip()]
+        commands = set()
+        for directory in os.environ.get('PATH', '').split(os.pathsep):
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_file() and os.access(entry.path, os.X_OK):
+                            commands.add(entry.name)
+            except OSError:
+                continue
+        return sorted(commands)
+
+    def search(self, query, limit, stop):
+        with self._lock:
+            if self.commands is None:
+                # Past the deadline the first time, but listed for the next query
+                self.commands = self._load()
+        return match_lines(query, self.commands, limit, stop)
+
+
+class DirectoryProvider(SearchProvider):
+    """
+    The paths of the files under a directory. The tree is walked a bit
+    further on each search, as far as its deadline allows, and the paths
+    found are kept, so the first searches of a large tree only see part of
+    it. The listing is walked again once it is refresh_seconds old.
+    """
+    name = 'files'
+    deadline_ms = 200
+
+    def __init__(self, root: str, refresh_seconds: float = 300, deadline_ms: int = None):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.refresh_seconds = refresh_seconds
+        self.paths: List[str] = []
+        self._walker = None
+        self._walked_at = 0.0
+        self._lock = threading.Lock()
+        if deadline_ms is not None:
+            self.deadline_ms = deadline_ms
+
+    def _walk(self):
+        for directory, dirs, files in os.walk(self.root):
+            # Hidden folders (.git and the like) are skipped
+            dirs[:] = [name for name in dirs if not name.startswith('.')]
+            for name in files:
+                yield os.path.join(directory, name)
+
+    def search(self, query, limit, stop):
+        with self._lock:
+            if self._walker is None and time.monotonic() - self._walked_at > self.refresh_seconds:
+                self.paths = []
+                self._walker = self._walk()
+                self._walked_at = time.monotonic()
+            known = len(self.paths)
+            return match_lines(query, chain(islice(self.paths, known), self._walk_more()), limit, stop)
+
+    def _walk_more(self):
+        # Continues the walk, keeping the paths found, until the matching stops asking
+        while self._walker is not None:
+            path = next(self._walker, None)
+            if path is None:
+                self._walker = None
+                return
+            self.paths.append(path)
+            yield path
+
+
+def providers_from_spec(spec: str) -> List[SearchProvider]:
+    """
+    Builds providers from a comma-separated list (FINDBOX_PROVIDERS), e.g.
+    "clipboard,commands,files=~/notes"; commands=FILE reads the commands from FILE.
+    """
+    providers = []
+    for item in spec.split(','):
+        name, _, argument = item.strip().partition('=')
+        if not name:
+            continue
+        if name == 'clipboard':
+            providers.append(ClipboardProvider())
+        elif name == 'commands':
+            providers.append(CommandProvider(argument or None))
+        elif name == 'files' and argument:
+            providers.append(DirectoryProvider(argument))
+        else:
+            raise ValueError(f"Unknown search provider {item.strip()!r}")
+    return providers
+
+
+class _ProviderJob(QRunnable):
+    def __init__(self, federated, generation: int, provider: SearchProvider, query: str, deadline: float):
+        super().__init__()
+        self.federated = federated
+        self.generation = generation
+        self.provider = provider
+        self.query = query
+        self.deadline = deadline
+
+    def run(self):
+        self.federated._run(self.generation, self.provider, self.query, self.deadline)
+
+
+class FederatedSearch(QObject):
+    """
+    Queries every provider at once, each on its own pool thread.
+
+    Requests are debounced and superseded like SearchWorker's. Each provider
+    emits results_ready(query, provider name, lines) as soon as it answers;
+    results arriving after the provider's deadline, or for a superseded
+    query, are dropped. late counts the answers cut off at their deadline.
+    """
+    results_ready = pyqtSignal(str, str, object)
+    _finished = pyqtSignal(int, str, str, object)
+
+    def __init__(self, providers: Sequence[SearchProvider], debounce_ms: int = 30, limit: int = 10, parent=None):
+        super().__init__(parent)
+        self.providers = list(providers)
+        self.limit = limit
+        self.generation = 0
+        self.late = 0
+        self._pending = None
+
+        # Room for a provider still finishing a superseded query next to the current one
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(1, 2 * len(self.providers)))
+
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(debounce_ms)
+        self.debounce_timer.timeout.connect(self._dispatch)
+
+        self._finished.connect(self._on_finished)
+        for provider in self.providers:
+            provider.start()
+
+    def request(self, query: str, immediate: bool = False):
+        """Schedules a query to every provider; results of earlier ones become stale."""
+        self.generation += 1
+        self._pending = query
+        if immediate:
+            self.debounce_timer.stop()
+            self._dispatch()
+        else:
+            self.debounce_timer.start()
+
+    def cancel(self):
+        """Drops the pending query and any result still in flight."""
+        self.generation += 1
+        self._pending = None
+        self.debounce_timer.stop()
+
+    def _dispatch(self):
+        if self._pending is None:
+            return
+        start = time.monotonic()
+        for provider in self.providers:
+            deadline = start + provider.deadline_ms / 1000
+            self.pool.start(_ProviderJob(self, self.generation, provider, self._pending, deadline))
+        self._pending = None
+
+    def _run(self, generation: int, provider: SearchProvider, query: str, deadline: float):
+        # Runs on a pool thread
+        if generation != self.generation:
+            return
+
+        def stop():
+            return generation != self.generation or time.monotonic() >= deadline
+
+        try:
+            lines = provider.search(query, self.limit, stop)
+        except Exception as e:
+            print(f"{provider.name} search error: {e}")
+            return
+        if time.monotonic() > deadline + LATE_GRACE_MS / 1000:
+            self.late += 1
+            return
+        self._finished.emit(generation, provider.name, query, lines)
+
+    def _on_finished(self, generation: int, name: str, query: str, lines):
+        if generation != self.generation:
+            return
+        self.results_ready.emit(query, name, lines)
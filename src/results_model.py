@@ -0,0 +1,87 @@
+from typing import List, Optional
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, Qt
+
+
+class ResultListModel(QAbstractListModel):
+    """
+    List model over a SearchResults page.
+
+    New results replace the rows in place (changed rows are refreshed, only
+    the difference in length is inserted or removed), and further rows are
+    pulled from the results lazily when the view scrolls past the end.
+    Results of other search providers (set_extra) are listed after them.
+    """
+
+    def __init__(self, page_size: int = 50, parent=None):
+        super().__init__(parent)
+        self.page_size = page_size
+        self.results = None
+        self.rows: List[str] = []
+        self.extra: List[str] = []
+
+    def set_results(self, results):
+        """Shows results (a SearchResults, or None to clear)."""
+        self.results = results
+        rows = list(results.rows) if results is not None else []
+        old_count, new_count = len(self.rows), len(rows)
+
+        if new_count < old_count:
+            self.beginRemoveRows(QModelIndex(), new_count, old_count - 1)
+            self.rows = rows
+            self.endRemoveRows()
+        elif new_count > old_count:
+            self.beginInsertRows(QModelIndex(), old_count, new_count - 1)
+            self.rows = rows
+            self.endInsertRows()
+        else:
+            self.rows = rows
+
+        kept = min(old_count, new_count)
+        if kept:
+            self.dataChanged.emit(self.index(0), self.index(kept - 1))
+
+    def set_extra(self, rows: List[str]):
+        """Replaces the rows listed after the results."""
+        start = len(self.rows)
+        if self.extra:
+            self.beginRemoveRows(QModelIndex(), start, start + len(self.extra) - 1)
+            self.extra = []
+            self.endRemoveRows()
+        if rows:
+            self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+            self.extra = list(rows)
+            self.endInsertRows()
+
+    def row_text(self, row: int) -> Optional[str]:
+        if 0 <= row < len(self.rows):
+            return self.rows[row]
+        if 0 <= row - len(self.rows) < len(self.extra):
+            return self.extra[row - len(self.rows)]
+        return None
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows) + len(self.extra)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return self.row_text(index.row())
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.results is None:
+            return False
+        return not self.results.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        more = self.results.fetch(self.page_size)
+        if not more:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(more) - 1)
+        self.rows.extend(more)
+        self.endInsertRows()
@@ -0,0 +1,69 @@
+"""
+Brute-force substring scan over packed texts, for queries the trigram index
+cannot narrow down: words shorter than a trigram, trigrams found in most
+entries, or an index built without postings.
+
+With NumPy the texts are compared a chunk of entries at a time as byte
+arrays, so checking every entry costs no Python work per entry. Without it
+the scan walks the buffer with bytes.find.
+"""
+from typing import Iterator, List
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from src.packed import PackedStrings
+
+AVAILABLE = np is not None
+
+# Entries compared per step, starting small and doubling up to the maximum:
+# results come out chunk by chunk, so a caller that only needs the first few
+# matches stops early without having paid for a large chunk
+FIRST_CHUNK_ENTRIES = 512
+CHUNK_ENTRIES = 16384
+
+
+def _positions(region, needle: bytes):
+    """Start offsets of needle in the uint8 array region."""
+    size = len(region) - len(needle) + 1
+    if size <= 0:
+        return np.empty(0, dtype=np.intp)
+    match = region[:size] == needle[0]
+    for k in range(1, len(needle)):
+        match &= region[k:k + size] == needle[k]
+    return np.flatnonzero(match)
+
+
+def _scan_chunks(strings: PackedStrings, needles: List[bytes], chunk_entries: int) -> Iterator[int]:
+    # Longest first: it usually has the fewest hits
+    needles = sorted(needles, key=len, reverse=True)
+    for buffer, offsets, origin, first in strings.parts():
+        count = len(offsets) - 1
+        lo, step = 0, min(FIRST_CHUNK_ENTRIES, chunk_entries)
+        while lo < count:
+            hi = min(count, lo + step)
+            start, end = offsets[lo], offsets[hi]
+            # Copies: the tail may grow while we look at it
+            region = np.frombuffer(bytes(buffer[origin + start:origin + end]), dtype=np.uint8)
+            bounds = np.array(offsets[lo:hi + 1], dtype=np.int64) - start
+            ids = None
+            for needle in needles:
+                hits = np.unique(np.searchsorted(bounds, _positions(region, needle), side='right') - 1)
+                ids = hits if ids is None else np.intersect1d(ids, hits, assume_unique=True)
+                if not len(ids):
+                    break
+            for i in ids.tolist():
+                yield first + lo + i
+            lo, step = hi, min(step * 2, chunk_entries)
+
+
+def scan_ids(strings: PackedStrings, needles: List[bytes], chunk_entries: int = CHUNK_ENTRIES) -> Iterator[int]:
+    """Yields, in order, the indexes of the strings containing every needle (UTF-8 encoded)."""
+    if np is not None:
+        yield from _scan_chunks(strings, needles, chunk_entries)
+        return
+    for i in strings.find_ids(max(needles, key=len)):
+        if strings.contains(i, needles):
+            yield i
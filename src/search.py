@@ -1,103 +1,726 @@
+import math
 import os
-from typing import List
-from PyQt6.QtCore import QFileSystemWatcher, QObject, pyqtSignal
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from itertools import chain, islice
+from typing import Callable, Iterable, Iterator, List, Tuple
+from PyQt6.QtCore import QFileSystemWatcher, QLockFile, QObject, QTimer, pyqtSignal
+from src.cache import ResultCache, cache_path
+from src.frecency import FrecencyStore, frecency_path
+from src.index import CONTENT, EXACT, FUZZY, PREFIX, SHORTCUT, SearchIndex, line_tier
+from src.snapshot import SourceKey, file_digest, is_current, read_snapshot, snapshot_path, write_snapshot
+from src.store import KeywordStore, LineStream, stream_diff
+
+# Edits touching more lines than this (or a quarter of the file) rebuild the index,
+# and so do this many lines inserted before others
+MAX_DIFF_LINES = 1000
+# A session only remembers the matches of queries with at most this many candidates
+CHAIN_MAX_CANDIDATES = 2000
+# Fuzzy scores gain this much per doubling of a line's usage score (an exact
+# word scores 3 to 4 more than a typo, so only near ties are turned around)
+FRECENCY_WEIGHT = 0.25
+
+
+def frecency_boost(score: float) -> float:
+    return FRECENCY_WEIGHT * math.log2(1 + score)
+
+
+def boost_tiers(picks: Iterable[Tuple[int, float, str]], lines: Iterable[str], tier: Callable[[str], int],
+                accept: Callable[[str], bool]) -> Iterator[str]:
+    """
+    Merges picks, (tier, score, line) in rank order as FrecencyStore.matching
+    returns them, into lines, which come tier by tier: each pick accept()ed
+    goes right before the other lines of its tier. tier(line) is only asked
+    while picks are left.
+    """
+    picks = deque(picks)
+    shown = set()
+    for line in lines:
+        if picks:
+            line_rank = tier(line)
+            while picks and picks[0][0] <= line_rank:
+                pick = picks.popleft()[2]
+                if pick not in shown and accept(pick):
+                    shown.add(pick)
+                    yield pick
+        if line not in shown:
+            yield line
+    for _, _, pick in picks:
+        if pick not in shown and accept(pick):
+            shown.add(pick)
+            yield pick
+
 
 class SearchEngine(QObject):
     data_changed = pyqtSignal()
+    # Emitted from the index thread after a job changed the data
+    _changed = pyqtSignal()
 
-    def __init__(self, data_file: str = "keyword.txt"):
+    def __init__(self, data_file: str = "keyword.txt", use_snapshot: bool = True, reload_delay_ms: int = 150,
+                 shared: bool = False, postings: bool = True, strip_accents: bool = True, cache_size: int = 256):
         super().__init__()
         self.data_file = os.path.abspath(data_file)
-        self.data: List[str] = []
-        self.load_data()
+        # False skips the trigram postings: quicker to build and smaller, but
+        # every search scans (see src/scan.py). Fine for one-off corpora.
+        self.postings = postings
+        # Whether "ca phe" finds "cà phê"; case is always ignored
+        self.strip_accents = strip_accents
+        # Binary copy of the index kept next to the keyword file for fast startup
+        self.snapshot_file = snapshot_path(self.data_file, postings) if use_snapshot else None
+        # Shared: several processes (e.g. plugin hosts) use one snapshot. The
+        # one holding the builder lock keeps it up to date, the others map it
+        # read-only and switch to every new version it writes.
+        self.shared = shared and self.snapshot_file is not None
+        self._builder_lock = None
+        if self.shared:
+            self._builder_lock = QLockFile(self.snapshot_file + '.lock')
+            # Only a lock whose process is gone is stale, however old it is
+            self._builder_lock.setStaleLockTime(0)
+        # SourceKey of the snapshot last written or read
+        self._snapshot_key = None
+        self.store = KeywordStore(self.data_file)
+        # How often and how recently each line was picked
+        self.frecency = FrecencyStore(frecency_path(self.data_file), strip_accents=strip_accents)
+        self.index = self._empty_index()
+        # Bumped whenever the indexed data changes
+        self.generation = 0
+        # (index, generation) and the picked lines found in it or not, for boost_frecent
+        self._indexed = (None, {})
+        # Picks change the ranking, so they are part of the result cache key too
+        self.selections = 0
+        # Results of repeated queries (0 turns it off); the most used queries
+        # are searched again at startup
+        self.cache = ResultCache(cache_path(self.data_file) if cache_size else None, cache_size)
+
+        # Every change to the index runs on this one thread, in order. Searches
+        # keep using the current index while a new one is built.
+        self._index_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="FindBoxIndex")
+        self._closed = False
+        self._sync_queued = False
+        self._changed.connect(self._on_changed)
+        self._load_initial()
+        # Queued after the initial load (or a stale snapshot's reload), so the
+        # saved queries are searched off the GUI thread, on the final index
+        self._submit(self._warm_job)
+
+        # Editors often save several times in a row: wait for them to settle
+        self.reload_timer = QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(reload_delay_ms)
+        self.reload_timer.timeout.connect(self._schedule_sync)
         
         # Watch for file changes
-        self.watcher = QFileSystemWatcher()
-        if os.path.exists(self.data_file):
-            self.watcher.addPath(self.data_file)
+        self.watcher = QFileSystemWatcher(self)
+        self._watch()
         self.watcher.fileChanged.connect(self.on_file_changed)
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+
+    def _watch(self):
+        """
+        (Re-)arms the file watcher. Saving by rename or replace drops the watched
+        path, so it is added again, or the folder is watched until the file is back.
+        A shared engine also watches the snapshot for new versions, and keeps
+        watching the folder: a new version replaces the file while the old one
+        may still be mapped, so the old file never reports being deleted.
+        """
+        paths = [self.data_file, self.snapshot_file] if self.shared else [self.data_file]
+        missing = False
+        for path in paths:
+            if path in self.watcher.files():
+                continue
+            if os.path.exists(path):
+                self.watcher.addPath(path)
+            else:
+                missing = True
+        directory = os.path.dirname(self.data_file)
+        watching = directory in self.watcher.directories()
+        if (missing or self.shared) and not watching and os.path.isdir(directory):
+            self.watcher.addPath(directory)
+        elif not (missing or self.shared) and watching:
+            self.watcher.removePath(directory)
 
     def on_file_changed(self, path):
-        print(f"File changed: {path}")
-        self.load_data()
+        if path == self.snapshot_file:
+            # Re-arm on whatever file is at the path now
+            self.watcher.removePath(path)
+            self._watch()
+            self._submit(self._attach_job)
+            return
+        self._watch()
+        self.reload_timer.start()
+
+    def on_directory_changed(self, path):
+        self._watch()
+        if self.shared:
+            self._submit(self._attach_job)
+        if os.path.exists(self.data_file):
+            self.reload_timer.start()
+
+    def _on_changed(self):
         self.data_changed.emit()
 
-    def load_data(self):
-        """Loads data from the TXT file (one phrase per line)."""
+    @property
+    def data(self) -> List[str]:
+        return self.index.file_lines()
+
+    def _in_sync(self) -> bool:
+        """Whether the file still looks exactly as the index last saw it."""
+        source = self.index.source
+        if source is None:
+            return False
+        try:
+            st = os.stat(self.data_file)
+        except OSError:
+            return False
+        return (st.st_size, st.st_mtime_ns) == (source.size, source.mtime_ns)
+
+    def _set_index(self, index: SearchIndex):
+        self.index = index
+        # Bump after the swap so sessions never tag an old index with the new generation
+        self.generation += 1
+
+    @property
+    def is_builder(self) -> bool:
+        """
+        Whether this engine maintains the index itself. A shared engine takes
+        over once the process that held the builder lock is gone.
+        """
+        if not self.shared:
+            return True
+        return self._builder_lock.isLocked() or self._builder_lock.tryLock(0)
+
+    def _load_initial(self):
+        """Starts from the index snapshot when there is one, else parses the file."""
+        snapshot = read_snapshot(self.snapshot_file) if self.snapshot_file else None
+        if not self.is_builder:
+            if snapshot is None:
+                print("Waiting for the shared index to be built.")
+                return
+            self._snapshot_key, index = snapshot
+            self._set_index(index)
+            print(f"Attached to the shared index of {len(index)} keywords.")
+            return
+
+        if snapshot is None or (snapshot[1].indexed, snapshot[1].strip_accents) != (self.postings, self.strip_accents):
+            self.load_data()
+            return
+
+        key, index = snapshot
+        self._snapshot_key = key
+        self._set_index(index)
+        if is_current(key, self.data_file):
+            print(f"Loaded {len(index)} keywords from index snapshot.")
+            return
+
+        # Serve the stale snapshot until the fresh index is ready
+        print("Index snapshot is stale, rebuilding in the background.")
+        self._submit(self._reload_job)
+
+    def _schedule_sync(self):
+        # One queued sync covers every change seen until it starts
+        if self._sync_queued:
+            return
+        self._sync_queued = True
+        self._submit(self._sync_job)
+
+    def _sync_job(self):
+        self._sync_queued = False
+        try:
+            if not self.is_builder:
+                # The builder updates the shared snapshot, _attach_job picks it up
+                return
+            if self._in_sync():
+                # Our own write, already reflected in the index
+                return
+            print(f"File changed: {self.data_file}")
+            if self._sync():
+                if self.shared:
+                    self._publish()
+                self._changed.emit()
+        except Exception as e:
+            print(f"Error reloading data: {e}")
+
+    def _attach_job(self):
+        """Switches a shared engine to the snapshot version the builder just wrote."""
+        try:
+            if self.is_builder:
+                # Only the builder writes snapshots, so it already has this one,
+                # unless it just took over and has catching up to do
+                if not self._in_sync() and self._sync():
+                    self._publish()
+                    self._changed.emit()
+                return
+            snapshot = read_snapshot(self.snapshot_file)
+            if snapshot is None or snapshot[0] == self._snapshot_key:
+                return
+            self._snapshot_key, index = snapshot
+            self._set_index(index)
+            print(f"Attached to the shared index of {len(index)} keywords.")
+            self._changed.emit()
+        except Exception as e:
+            print(f"Error attaching to the shared index: {e}")
+
+    def _publish(self):
+        """Writes the live index as a new version of the shared snapshot."""
+        source = self.index.source
+        if source is None:
+            return
+        key = SourceKey(source.size, source.mtime_ns, file_digest(self.data_file))
+        write_snapshot(self.snapshot_file, key, self.index)
+        self._snapshot_key = key
+
+    def _reload_job(self):
+        try:
+            self._load()
+            self._changed.emit()
+        except Exception as e:
+            print(f"Error reloading data: {e}")
+
+    def _build_index(self) -> SearchIndex:
+        """Reads and indexes the whole keyword file."""
         if not os.path.exists(self.data_file):
             print(f"Warning: {self.data_file} not found.")
-            self.data = []
-            return
+            return self._empty_index()
+
+        try:
+            # Indexed line by line as the file is read: only the index grows with it
+            stream = self.store.stream()
+            return self._index_lines(stream, stream)
+        except Exception as e:
+            print(f"Error loading data: {e}")
+            return self._empty_index()
+
+    def _empty_index(self) -> SearchIndex:
+        return SearchIndex(postings=self.postings, strip_accents=self.strip_accents)
+
+    def _index_lines(self, lines: Iterable[str], stream: LineStream) -> SearchIndex:
+        """
+        Builds the index for lines read through stream (or for the stream
+        itself) and refreshes the snapshot.
+        """
+        index = SearchIndex(lines, self.postings, self.strip_accents)
+        source = index.source = stream.state
+        if self.snapshot_file:
+            key = SourceKey(source.size, source.mtime_ns, stream.digest)
+            write_snapshot(self.snapshot_file, key, index)
+            self._snapshot_key = key
+            # Serve from the mapped snapshot so the freshly built copy can be freed
+            snapshot = read_snapshot(self.snapshot_file)
+            if snapshot is not None and snapshot[0] == key:
+                index = snapshot[1]
+        return index
+
+    def _load(self):
+        self._set_index(self._build_index())
+        print(f"Loaded {len(self.index)} keywords.")
+
+    def load_data(self):
+        """Loads data from the TXT file (one phrase per line) and indexes it."""
+        future = self._submit(self._load)
+        if future is not None:
+            future.result()
+
+    def _sync(self) -> bool:
+        """
+        Brings the index up to date with the keyword file, touching only what
+        changed: appended lines are read from the last offset and small edits
+        are applied as a line diff. Big changes read the file again into a new
+        index that replaces the live one in a single swap. Runs on the index thread.
+        Returns False if the file's lines did not change.
+        """
+        index = self.index
+        if index.source is None or not os.path.exists(self.data_file):
+            self._load()
+            return True
 
         try:
-            # Add a small delay or retry mechanism might be needed if file is being written to
-            # But for now, direct read.
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                # Read lines and strip whitespace
-                lines = [line.strip() for line in f.readlines()]
-                # Filter out empty lines
-                self.data = [line for line in lines if line]
-            print(f"Loaded {len(self.data)} keywords.")
+            appended = self.store.read_appended(index.source)
+            if appended is None:
+                # Compared line by line as the file is read, keeping only the changed lines
+                stream = self.store.stream()
+                max_changed = max(MAX_DIFF_LINES, len(index.lines) // 4)
+                diff = stream_diff(index.file_line, len(index.lines), stream, max_changed)
         except Exception as e:
             print(f"Error loading data: {e}")
-            self.data = []
+            return False
+
+        if appended is not None:
+            lines, source = appended
+            start = len(index.lines) - 1 if index.source.partial else len(index.lines)
+            changed = bool(lines) or index.source.partial
+            if changed:
+                index.replace(start, len(index.lines), lines)
+                print(f"Read {len(lines)} appended keywords.")
+            index.source = source
+        else:
+            if diff is None or index.removed > diff[3] or len(index.moved) > MAX_DIFF_LINES:
+                # Mostly new content, mostly dead entries, or many lines merged
+                # back into file order on every search: start over
+                self._load()
+                return True
+            start, old_end, lines, _ = diff
+            changed = old_end > start or bool(lines)
+            if changed:
+                index.replace(start, old_end, lines)
+                print(f"Applied {(old_end - start) + len(lines)} changed lines.")
+            index.source = stream.state
+
+        if changed:
+            index.refresh_order()
+            self.generation += 1
+        return changed
+
+    def add_keyword(self, text: str) -> bool:
+        """
+        Appends a keyword to the file and inserts it into the live index, in
+        the background. Returns False if it is empty or already present.
+        """
+        text = text.strip()
+        if not text or text in self.index:
+            return False
+        return self._submit(self._add_job, text) is not None
 
-    def search(self, query: str, limit: int = 10) -> List[str]:
+    def _add_job(self, text: str):
+        if text in self.index:
+            return
+        # Announced once, outside edits picked up on the way included
+        changed = False
+        try:
+            builder = self.is_builder
+            # Pick up pending outside edits first, the new state would hide them
+            if builder and os.path.exists(self.data_file) and not self._in_sync():
+                changed = self._sync()
+
+            source = self.store.append(text)
+            self.index.add(text)
+            self.index.refresh_order()
+            self.index.source = source
+            self.generation += 1
+            changed = True
+            # Other engines only add to their own copy until the builder publishes
+            if builder and self.store.should_compact():
+                self._compact()
+            elif builder and self.shared:
+                self._publish()
+        except Exception as e:
+            print(f"Error adding keyword: {e}")
+        if changed:
+            self._changed.emit()
+
+    def compact(self):
+        """Rewrites the keyword file without blank or duplicate lines."""
+        future = self._submit(self._compact)
+        if future is not None:
+            future.result()
+
+    def _compact(self):
+        self.index.dedupe()
+        key, self.index.source = self.store.rewrite(self.index.file_lines())
+        # The index already matches the rewritten file, so this also refreshes the snapshot
+        if self.snapshot_file:
+            write_snapshot(self.snapshot_file, key, self.index)
+            self._snapshot_key = key
+
+    def _submit(self, job, *args):
+        """Queues job on the index thread. Returns its future, or None once closed."""
+        try:
+            return self._index_thread.submit(job, *args)
+        except RuntimeError:
+            # Shut down by close()
+            return None
+
+    def after_load(self, job, *args):
+        """
+        Runs job on the index thread once the loads queued so far are done.
+        Returns its future, or None once closed.
+        """
+        return self._submit(job, *args)
+
+    def close(self):
+        """
+        Stops watching the file, finishes pending index work, saves usage
+        counts and releases the builder lock.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        # A change seen after this must not reach the shut-down index thread
+        self.reload_timer.stop()
+        self.reload_timer.timeout.disconnect(self._schedule_sync)
+        self.watcher.fileChanged.disconnect(self.on_file_changed)
+        self.watcher.directoryChanged.disconnect(self.on_directory_changed)
+        paths = self.watcher.files() + self.watcher.directories()
+        if paths:
+            self.watcher.removePaths(paths)
+        self._index_thread.shutdown(wait=True)
+        self.frecency.flush()
+        self.cache.save()
+        if self._builder_lock is not None and self._builder_lock.isLocked():
+            self._builder_lock.unlock()
+
+    def search(self, query: str, limit: int = 10, mode: str = EXACT) -> List[str]:
         """
         Searches for all query words in the data.
-        Returns a list of matching strings, case-insensitive.
+        Returns a list of matching strings, ignoring case and (unless
+        strip_accents is off) accents.
         Words can appear in any order.
         
         Format support: "shortcut||content"
         - Search both shortcut and content parts
         - Prioritize matches in the shortcut part (before ||)
+
+        With mode=PREFIX, a one-word query first gets the lines whose
+        shortcut starts with it. With mode=FUZZY, words may contain a typo and
+        results are ranked by how well they match instead of by file order.
         """
         if not query:
             return []
 
-        query_words = query.lower().split()
+        # Read the generation before the index: a reload in between then only
+        # files the new results under the old generation
+        key = (self.generation, self.selections)
+        index = self.index
+        query_words = index.fold(query).split()
         if not query_words:
             return []
 
-        matches = []
-        
-        # Parse data into structured format
-        parsed_items = []
-        for item in self.data:
-            if '||' in item:
-                parts = item.split('||', 1)
-                shortcut = parts[0].strip()
-                content = parts[1].strip() if len(parts) > 1 else ''
-                parsed_items.append({
-                    'display': item,
-                    'shortcut_lower': shortcut.lower(),
-                    'content_lower': content.lower()
-                })
+        key = (' '.join(query_words), limit, mode) + key
+        lines = self.cache.get(key)
+        if lines is None:
+            lines = self._search(index, query_words, limit, mode)
+            self.cache.put(key, lines)
+        return lines
+
+    def remember(self, query: str, limit: int, mode: str, lines: List[str]):
+        """Files the results of a search run elsewhere (a worker process) in the result cache."""
+        key = (self.generation, self.selections)
+        query_words = self.index.fold(query).split()
+        if query_words:
+            self.cache.put((' '.join(query_words), limit, mode) + key, lines)
+
+    def _warm_job(self):
+        try:
+            self.warm_cache()
+        except Exception as e:
+            print(f"Error warming the result cache: {e}")
+
+    def warm_cache(self):
+        """Caches the results of the queries saved by the last run."""
+        key = (self.generation, self.selections)
+        index = self.index
+        if not len(index):
+            return
+        for query, limit, mode in self.cache.saved_queries():
+            words = query.split()
+            self.cache.put((query, limit, mode) + key, self._search(index, words, limit, mode))
+
+    def _search(self, index: SearchIndex, query_words: List[str], limit: int, mode: str) -> List[str]:
+        return list(islice(self._results(index, query_words, limit, mode), limit))
+
+    def _results(self, index: SearchIndex, query_words: List[str], fuzzy_limit: int, mode: str) -> Iterator[str]:
+        """Every result in rank order, lazily; fuzzy ones stop at the best fuzzy_limit."""
+        if mode == FUZZY:
+            return iter(self.blend_fuzzy(index.fuzzy_scored(query_words, fuzzy_limit)))
+        lines = index.iter_lines(index.tiers(query_words, mode == PREFIX))
+        return self.boost_frecent(index, query_words, lines, mode)
+
+    def blend_fuzzy(self, scored: Iterable[Tuple[float, str]]) -> List[str]:
+        """Ranks fuzzy (score, line) pairs by their score plus a boost for the lines picked often."""
+        blended = [(score + frecency_boost(self.frecency.score(line)), line) for score, line in scored]
+        blended.sort(key=lambda item: -item[0])
+        return [line for _, line in blended]
+
+    def boost_frecent(self, index: SearchIndex, words: List[str], lines: Iterable[str], mode: str = EXACT) -> Iterator[str]:
+        """
+        Moves the lines picked most often up within their tier (prefix,
+        shortcut or content matches, see SearchIndex.tiers), most used first,
+        but never above a better tier. Picked lines further down the file are
+        pulled up the same way.
+        """
+        prefix = mode == PREFIX
+        picks = self.frecency.matching(words, prefix)
+        if not picks:
+            return iter(lines)
+        # Picks are checked one by one as they are taken, so a page only looks up its own
+        return boost_tiers(picks, lines, lambda line: line_tier(line, words, prefix, index.strip_accents),
+                           lambda line: self.is_indexed(index, line))
+
+    def is_indexed(self, index: SearchIndex, line: str) -> bool:
+        """
+        Whether a picked line is an entry of index. Each lookup costs a
+        trigram intersection, so answers are kept until the data changes.
+        """
+        key = (index, self.generation)
+        known = self._indexed
+        if known[0] != key:
+            known = self._indexed = (key, {})
+        found = known[1].get(line)
+        if found is None:
+            found = known[1][line] = line in index
+        return found
+
+    def record_selection(self, line: str) -> bool:
+        """
+        Counts a picked result so it ranks higher next time.
+        Typed text that is not an entry is ignored.
+        """
+        if line not in self.index:
+            return False
+        self.frecency.record(line)
+        self.selections += 1
+        return True
+
+    def session(self) -> 'SearchSession':
+        """Returns a new refinement session bound to this engine."""
+        return SearchSession(self)
+
+
+class SearchSession:
+    """
+    Search state for one typing session (e.g. one overlay).
+
+    Each query is remembered with the ids it matched. When the next query only
+    extends one in the chain ("dep" -> "depl"), its matches must be among those
+    ids, so only they are re-checked instead of the whole index. Backspace walks
+    back down the chain; any other edit falls back to a full search. Queries
+    with too many candidates (see CHAIN_MAX_CANDIDATES) are searched lazily
+    instead, stopping at the first page.
+    """
+
+    def __init__(self, search_engine: SearchEngine, max_depth: int = 64):
+        self.search_engine = search_engine
+        self.max_depth = max_depth
+        # Ranked results kept per fuzzy query, in pages of first_page
+        self.fuzzy_pages = 5
+        self._generation = None
+        # (folded query, matching ids per column), each step extending the previous one
+        self._chain = []
+
+    def reset(self):
+        self._chain = []
+
+    def search(self, query: str, limit: int = 10, mode: str = EXACT) -> List[str]:
+        """Same results as SearchEngine.search, reusing the previous keystrokes."""
+        return self.search_results(query, limit, mode).rows
+
+    def search_results(self, query: str, first_page: int = 10, mode: str = EXACT) -> 'SearchResults':
+        """
+        Like search, but more results can be fetched from the returned object later.
+        Fuzzy results are ranked up front, so they stop at fuzzy_pages pages.
+        The first page shares the engine's result cache with search.
+        """
+        engine = self.search_engine
+        key = (engine.generation, engine.selections)
+        words = engine.index.fold(query).split()
+        if not words:
+            return SearchResults(query, (), first_page)
+        key = (' '.join(words), first_page, mode) + key
+        # A cached page is continued without the session: fetch() runs on the GUI thread
+        more = lambda: engine._results(engine.index, words, first_page * self.fuzzy_pages, mode)
+        return SearchResults.cached(engine.cache, key, query, lambda: self._lines(query, first_page, mode), more,
+                                    first_page)
+
+    def _lines(self, query: str, first_page: int, mode: str) -> Iterable[str]:
+        if mode == FUZZY:
+            index = self.search_engine.index
+            words = index.fold(query).split()
+            return self.search_engine.blend_fuzzy(index.fuzzy_scored(words, first_page * self.fuzzy_pages))
+
+        index, words, tiers = self.tiers(query, mode)
+        lines = index.iter_lines(tiers)
+        return self.search_engine.boost_frecent(index, words, lines, mode)
+
+    def tiers(self, query: str, mode: str = EXACT) -> Tuple[SearchIndex, List[str], List[Iterable[int]]]:
+        """
+        Returns (index, folded query words, SearchIndex.tiers of the words)
+        for an exact or prefix query, reusing the previous keystrokes.
+        """
+        # Read the generation first: a reload in between only costs a reset
+        generation = self.search_engine.generation
+        index = self.search_engine.index
+        folded = index.fold(query)
+        words = folded.split()
+        if not words:
+            return index, words, []
+        if generation != self._generation:
+            self._chain = []
+            self._generation = generation
+
+        while self._chain and not folded.startswith(self._chain[-1][0]):
+            self._chain.pop()
+
+        if self._chain and self._chain[-1][0] == folded:
+            matches = self._chain[-1][1]
+        else:
+            if self._chain:
+                base = self._chain[-1][1]
             else:
-                # No separator, treat whole line as both shortcut and content
-                parsed_items.append({
-                    'display': item,
-                    'shortcut_lower': item.lower(),
-                    'content_lower': item.lower()
-                })
-
-        def all_words_in(text, words):
-            return all(word in text for word in words)
-
-        # Priority 1: All words in shortcut
-        for item in parsed_items:
-            if all_words_in(item['shortcut_lower'], query_words):
-                if item['display'] not in matches:
-                    matches.append(item['display'])
-                    if len(matches) >= limit:
-                        return matches
-        
-        # Priority 2: All words in content
-        for item in parsed_items:
-            if all_words_in(item['content_lower'], query_words):
-                if item['display'] not in matches:
-                    matches.append(item['display'])
-                    if len(matches) >= limit:
-                        return matches
-                    
-        return matches
+                base = (None, None)
+                bounds = [index.candidate_bound(column, words) for column in (SHORTCUT, CONTENT)]
+                if any(bound is None or bound > CHAIN_MAX_CANDIDATES for bound in bounds):
+                    # Too short for the trigram index, or too common: listing every
+                    # match costs more than a lazy search stopping at the first page,
+                    # so the chain starts once a longer query narrows it down
+                    return index, words, index.tiers(words, mode == PREFIX)
+            matches = (
+                index.match_ids(SHORTCUT, words, base[SHORTCUT]),
+                index.match_ids(CONTENT, words, base[CONTENT]),
+            )
+            self._chain.append((folded, matches))
+            if len(self._chain) > self.max_depth:
+                del self._chain[0]
+
+        tiers = list(matches)
+        if mode == PREFIX and len(words) == 1:
+            # The prefix lookup is one binary search, no need to chain it
+            tiers.insert(0, index.prefix_ids(words[0]))
+        return index, words, tiers
+
+
+class SearchResults:
+    """
+    Results of one query, produced lazily. The first page is fetched when the
+    object is created; fetch() pulls more rows when they are needed.
+    """
+
+    def __init__(self, query: str, lines: Iterable[str], first_page: int = 10):
+        self.query = query
+        self.rows: List[str] = []
+        self.exhausted = False
+        self._lines = iter(lines)
+        self.fetch(first_page)
+
+    @classmethod
+    def cached(cls, cache: ResultCache, key, query: str, search: Callable[[], Iterable[str]],
+               more: Callable[[], Iterable[str]], first_page: int = 10) -> 'SearchResults':
+        """
+        Results whose first page comes from cache under key when it is there,
+        else from search(), and is cached. After a cached page, more() lists
+        the results again once more rows are fetched, on whatever thread
+        fetches them, so it must not touch a session.
+        """
+        rows = cache.get(key)
+        if rows is None:
+            results = cls(query, search(), first_page)
+            cache.put(key, results.rows)
+            return results
+        if len(rows) < first_page:
+            # A short page holds every match
+            return cls(query, rows, first_page)
+
+        def rest():
+            shown = set(rows)
+            yield from (line for line in more() if line not in shown)
+
+        return cls(query, chain(rows, rest()), first_page)
+
+    def fetch(self, count: int) -> List[str]:
+        """Appends up to count more rows and returns them."""
+        if self.exhausted:
+            return []
+        more = list(islice(self._lines, count))
+        if len(more) < count:
+            self.exhausted = True
+            self._lines = None
+        self.rows.extend(more)
+        return more
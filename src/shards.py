@@ -0,0 +1,320 @@
+"""
+Several keyword files searched as one corpus.
+
+Every file is a shard: a SearchEngine with its own index, snapshot, watcher
+and usage counts, so an edit to one file only reloads that file. Queries go
+to every shard and the results are merged tier by tier (see
+SearchIndex.tiers), so a shortcut match in any file still ranks above the
+content matches of all of them; within a tier, files keep the order they
+were given in.
+"""
+import glob
+import multiprocessing
+import os
+import sys
+from itertools import islice
+from typing import Iterable, Iterator, List, Sequence, Tuple
+from PyQt6.QtCore import QObject, pyqtSignal
+from src.cache import ResultCache, cache_path
+from src.index import EXACT, FUZZY, PREFIX, SearchIndex, fold, line_tier
+from src.search import SearchEngine, SearchResults, boost_tiers, frecency_boost
+from src.snapshot import SourceKey, is_current, read_snapshot, snapshot_path, write_snapshot
+from src.store import KeywordStore
+
+# Keyword files picked up from a directory
+TEXT_PATTERNS = ('*.txt', '*.txt.gz', '*.txt.bz2', '*.txt.xz')
+
+
+def expand_sources(sources) -> List[str]:
+    """
+    Turns file names, directories (their *.txt files, also compressed) and
+    glob patterns into the list of keyword files, each listed once, in the
+    order given.
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+    files = []
+    for source in sources:
+        if os.path.isdir(source):
+            found = sorted(path for pattern in TEXT_PATTERNS for path in glob.glob(os.path.join(source, pattern)))
+        elif any(char in source for char in '*?['):
+            found = sorted(glob.glob(source))
+        else:
+            # A file that does not exist yet is watched until it shows up
+            found = [source]
+        for path in found:
+            path = os.path.abspath(path)
+            if path not in files:
+                files.append(path)
+    return files
+
+
+def open_engine(sources, **options):
+    """
+    Returns a SearchEngine for a single keyword file, or a ShardedEngine
+    over every file the sources expand to. options go to SearchEngine.
+    """
+    files = expand_sources(sources)
+    if not files:
+        raise ValueError(f"No keyword files found in {sources!r}")
+    if len(files) == 1:
+        return SearchEngine(files[0], **options)
+    return ShardedEngine(files, **options)
+
+
+def process_context():
+    """
+    The multiprocessing context for worker pools: fork where it is safe, so
+    workers start at once and share the parent's memory. On macOS system
+    frameworks (Qt's among them) may crash in a forked child, so workers
+    come from a fresh forkserver process there, or are spawned.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if sys.platform != 'darwin' and 'fork' in methods:
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _needs_build(data_file: str, postings: bool, strip_accents: bool) -> bool:
+    if not os.path.exists(data_file):
+        return False
+    snapshot = read_snapshot(snapshot_path(data_file, postings))
+    if snapshot is None:
+        return True
+    key, index = snapshot
+    return (index.indexed, index.strip_accents) != (postings, strip_accents) or not is_current(key, data_file)
+
+
+def _build_snapshot(data_file: str, postings: bool, strip_accents: bool) -> int:
+    """Indexes one keyword file into its snapshot, in a worker process. Returns the line count, or -1."""
+    try:
+        stream = KeywordStore(data_file).stream()
+        index = SearchIndex(stream, postings, strip_accents)
+        source = index.source = stream.state
+        write_snapshot(snapshot_path(data_file, postings), SourceKey(source.size, source.mtime_ns, stream.digest), index)
+        return len(index)
+    except Exception as e:
+        print(f"Error indexing {data_file}: {e}")
+        return -1
+
+
+def build_snapshots(data_files: Sequence[str], workers: int = None, postings: bool = True,
+                    strip_accents: bool = True) -> int:
+    """
+    Brings the snapshots of data_files up to date, indexing the stale ones in
+    a process pool: indexing is CPU-bound Python, so threads would take turns.
+    The shards then only map their snapshot. Returns how many were rebuilt.
+    """
+    stale = [path for path in data_files if _needs_build(path, postings, strip_accents)]
+    if len(stale) < 2:
+        # A single shard is no quicker in a pool; it builds itself
+        return 0
+    workers = min(workers or os.cpu_count() or 1, len(stale))
+    with process_context().Pool(workers) as pool:
+        counts = pool.starmap(_build_snapshot, [(path, postings, strip_accents) for path in stale])
+    print(f"Indexed {len(stale)} keyword files ({sum(max(0, count) for count in counts)} keywords) "
+          f"on {workers} processes.")
+    return len(stale)
+
+
+def merge_tiers(shard_tiers: Iterable[Tuple[SearchIndex, List[Iterable[int]]]]) -> Iterator[str]:
+    """
+    Yields the distinct lines of every shard's tiers: the first tier of all
+    shards, then the second one, and so on.
+    """
+    shard_tiers = list(shard_tiers)
+    seen = set()
+    for level in range(max((len(tiers) for _, tiers in shard_tiers), default=0)):
+        for index, tiers in shard_tiers:
+            if level >= len(tiers):
+                continue
+            for line in index.iter_lines((tiers[level],)):
+                if line not in seen:
+                    seen.add(line)
+                    yield line
+
+
+class ShardedEngine(QObject):
+    """
+    Searches several keyword files, one SearchEngine shard per file, behind
+    the SearchEngine interface the overlay, the query server and the plugin
+    use. Stale shard snapshots are built in parallel first (build_snapshots).
+    New keywords go to the first file. Results are cached for the whole
+    corpus, next to the first file, rather than per shard.
+    """
+    data_changed = pyqtSignal()
+
+    def __init__(self, data_files: Sequence[str], workers: int = None, **options):
+        super().__init__()
+        self.data_files = list(data_files)
+        self.strip_accents = options.get('strip_accents', True)
+        cache_size = options.pop('cache_size', 256)
+        self.cache = ResultCache(cache_path(self.data_files[0]) if cache_size else None, cache_size)
+        # Shared shards are kept up to date by their builder process instead
+        if options.get('use_snapshot', True) and not options.get('shared', False):
+            build_snapshots(self.data_files, workers, options.get('postings', True), self.strip_accents)
+        self.shards = [SearchEngine(path, cache_size=0, **options) for path in self.data_files]
+        for shard in self.shards:
+            shard.data_changed.connect(self.data_changed)
+        # Off the GUI thread, once every shard's initial load is done
+        loaded = [shard.after_load(lambda: None) for shard in self.shards[1:]]
+        self.shards[0].after_load(self._warm_job, loaded)
+
+    @property
+    def generation(self) -> int:
+        # Every shard's generation only grows, so their sum changes with any of them
+        return sum(shard.generation for shard in self.shards)
+
+    @property
+    def selections(self) -> int:
+        return sum(shard.selections for shard in self.shards)
+
+    def __len__(self):
+        return sum(len(shard.index) for shard in self.shards)
+
+    def fold(self, query: str) -> str:
+        return fold(query, self.strip_accents)
+
+    def search(self, query: str, limit: int = 10, mode: str = EXACT) -> List[str]:
+        """Same as SearchEngine.search, over every shard."""
+        key = (self.generation, self.selections)
+        words = self.fold(query).split()
+        if not words:
+            return []
+        key = (' '.join(words), limit, mode) + key
+        lines = self.cache.get(key)
+        if lines is None:
+            lines = self._search(words, limit, mode)
+            self.cache.put(key, lines)
+        return lines
+
+    def _warm_job(self, loaded):
+        try:
+            for future in loaded:
+                if future is not None:
+                    future.result()
+            self.warm_cache()
+        except Exception as e:
+            print(f"Error warming the result cache: {e}")
+
+    def warm_cache(self):
+        """Caches the results of the queries saved by the last run."""
+        key = (self.generation, self.selections)
+        if not len(self):
+            return
+        for query, limit, mode in self.cache.saved_queries():
+            self.cache.put((query, limit, mode) + key, self._search(query.split(), limit, mode))
+
+    def _search(self, words: List[str], limit: int, mode: str) -> List[str]:
+        return list(islice(self._results(words, limit, mode), limit))
+
+    def _results(self, words: List[str], fuzzy_limit: int, mode: str) -> Iterator[str]:
+        """Every result in rank order, lazily; fuzzy ones stop at the best fuzzy_limit."""
+        if mode == FUZZY:
+            return iter(self.blend_fuzzy(self.fuzzy_scored(words, fuzzy_limit)))
+        lines = merge_tiers((index, index.tiers(words, mode == PREFIX))
+                            for index in [shard.index for shard in self.shards])
+        return self.boost_frecent(words, lines, mode)
+
+    def fuzzy_scored(self, words: List[str], limit: int) -> List[Tuple[float, str]]:
+        """The best limit (score, line) pairs of all shards by fuzzy score; ties keep the shard order."""
+        scored = []
+        for shard in self.shards:
+            scored.extend(shard.index.fuzzy_scored(words, limit))
+        scored.sort(key=lambda item: -item[0])
+        best = []
+        seen = set()
+        for score, line in scored:
+            if line not in seen:
+                seen.add(line)
+                best.append((score, line))
+                if len(best) == limit:
+                    break
+        return best
+
+    def frecency_score(self, line: str) -> float:
+        return sum(shard.frecency.score(line) for shard in self.shards)
+
+    def blend_fuzzy(self, scored: Iterable[Tuple[float, str]]) -> List[str]:
+        """SearchEngine.blend_fuzzy, with the usage counts of every shard."""
+        blended = [(score + frecency_boost(self.frecency_score(line)), line) for score, line in scored]
+        blended.sort(key=lambda item: -item[0])
+        return [line for _, line in blended]
+
+    def boost_frecent(self, words: List[str], lines: Iterable[str], mode: str = EXACT) -> Iterator[str]:
+        """SearchEngine.boost_frecent, with the usage counts of every shard."""
+        prefix = mode == PREFIX
+        # Looked up in their shard only as they are taken, like SearchEngine.boost_frecent
+        found = {}
+        for shard in self.shards:
+            for tier, _, line in shard.frecency.matching(words, prefix):
+                found.setdefault(line, (tier, shard))
+        if not found:
+            return iter(lines)
+        picks = [(tier, self.frecency_score(line), line) for line, (tier, _) in found.items()]
+        picks.sort(key=lambda item: (item[0], -item[1]))
+
+        def accept(line):
+            shard = found[line][1]
+            return shard.is_indexed(shard.index, line)
+
+        return boost_tiers(picks, lines, lambda line: line_tier(line, words, prefix, self.strip_accents), accept)
+
+    def record_selection(self, line: str) -> bool:
+        """Counts a picked result in the usage counts of the file it came from."""
+        return any(shard.record_selection(line) for shard in self.shards)
+
+    def add_keyword(self, text: str) -> bool:
+        """Adds a keyword to the first file, unless some file already has it."""
+        text = text.strip()
+        if not text or any(text in shard.index for shard in self.shards):
+            return False
+        return self.shards[0].add_keyword(text)
+
+    def compact(self):
+        for shard in self.shards:
+            shard.compact()
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+        self.cache.save()
+
+    def session(self) -> 'ShardedSession':
+        return ShardedSession(self)
+
+
+class ShardedSession:
+    """SearchSession over every shard, each refining its own previous keystrokes."""
+
+    def __init__(self, search_engine: ShardedEngine):
+        self.search_engine = search_engine
+        self.sessions = [shard.session() for shard in search_engine.shards]
+        self.fuzzy_pages = 5
+
+    def reset(self):
+        for session in self.sessions:
+            session.reset()
+
+    def search(self, query: str, limit: int = 10, mode: str = EXACT) -> List[str]:
+        return self.search_results(query, limit, mode).rows
+
+    def search_results(self, query: str, first_page: int = 10, mode: str = EXACT) -> SearchResults:
+        engine = self.search_engine
+        key = (engine.generation, engine.selections)
+        words = engine.fold(query).split()
+        if not words:
+            return SearchResults(query, (), first_page)
+        key = (' '.join(words), first_page, mode) + key
+        # A cached page is continued without the sessions: fetch() runs on the GUI thread
+        more = lambda: engine._results(words, first_page * self.fuzzy_pages, mode)
+        return SearchResults.cached(engine.cache, key, query, lambda: self._lines(query, words, first_page, mode),
+                                    more, first_page)
+
+    def _lines(self, query: str, words: List[str], first_page: int, mode: str) -> Iterable[str]:
+        engine = self.search_engine
+        if mode == FUZZY:
+            return engine.blend_fuzzy(engine.fuzzy_scored(words, first_page * self.fuzzy_pages))
+        lines = merge_tiers((index, tiers) for index, _, tiers in
+                            [session.tiers(query, mode) for session in self.sessions])
+        return engine.boost_frecent(words, lines, mode)
@@ -0,0 +1,133 @@
+import base64
+import hashlib
+import json
+import mmap
+import os
+import struct
+from typing import NamedTuple, Optional, Tuple
+from src.files import atomic_write
+
+MAGIC = b'FBINDEX\0'
+# Bump when the layout of SearchIndex changes so old snapshots get rebuilt
+VERSION = 10
+
+# magic, version, source size, source mtime (ns), source digest, table offset
+_HEADER = struct.Struct('<8sIQq16sQ')
+# Sections start at multiples of this so typed views over them are aligned
+_ALIGN = 8
+
+# Windows cannot replace a file that is mapped, which would keep a running
+# instance from ever refreshing its snapshot, so it reads a copy instead
+MAP_SNAPSHOTS = os.name != 'nt'
+
+
+class SourceKey(NamedTuple):
+    """Identifies the exact keyword file contents a snapshot was built from."""
+    size: int
+    mtime_ns: int
+    digest: bytes
+
+
+def snapshot_path(data_file: str, postings: bool = True) -> str:
+    # Scan-only indexes (no postings) get their own file, so they never replace the full one
+    return data_file + ('.idx' if postings else '.scan.idx')
+
+
+def new_digest():
+    """A hash to feed the keyword file's bytes to, for SourceKey.digest."""
+    return hashlib.blake2b(digest_size=16)
+
+
+def digest_bytes(data: bytes) -> bytes:
+    h = new_digest()
+    h.update(data)
+    return h.digest()
+
+
+def file_digest(path: str) -> bytes:
+    h = new_digest()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.digest()
+
+
+def is_current(key: SourceKey, data_file: str) -> bool:
+    """
+    Checks whether data_file still has the contents described by key.
+    Size and mtime answer the common case without reading the file; the
+    digest is only computed when the mtime moved but the size did not.
+    """
+    try:
+        st = os.stat(data_file)
+        if st.st_size != key.size:
+            return False
+        if st.st_mtime_ns == key.mtime_ns:
+            return True
+        return file_digest(data_file) == key.digest
+    except OSError:
+        return False
+
+
+def _encode_bytes(value):
+    if isinstance(value, bytes):
+        return {'base64': base64.b64encode(value).decode('ascii')}
+    raise TypeError(f"Cannot store {type(value).__name__} in a snapshot table")
+
+
+def _decode_bytes(obj: dict):
+    return base64.b64decode(obj['base64']) if obj.keys() == {'base64'} else obj
+
+
+def write_snapshot(path: str, key: SourceKey, index):
+    """
+    Writes the index next to the keyword file, replacing any old snapshot atomically.
+
+    After the header come the index's sections as raw bytes, then a JSON
+    table of their (offset, length) plus the index metadata, so a reader can
+    map the file and use the sections in place. JSON rather than pickle: a
+    shared snapshot must not be able to run code in the reader.
+    """
+    try:
+        sections, meta = index.to_sections()
+        table = {}
+        with atomic_write(path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, key.size, key.mtime_ns, key.digest, 0))
+            for name, data in sections:
+                f.write(b'\0' * (-f.tell() % _ALIGN))
+                offset = f.tell()
+                for chunk in data if isinstance(data, list) else (data,):
+                    f.write(chunk)
+                table[name] = (offset, f.tell() - offset)
+            table_offset = f.tell()
+            f.write(json.dumps({'sections': table, 'meta': meta}, default=_encode_bytes).encode('utf-8'))
+            f.seek(0)
+            f.write(_HEADER.pack(MAGIC, VERSION, key.size, key.mtime_ns, key.digest, table_offset))
+    except Exception as e:
+        print(f"Error writing index snapshot: {e}")
+
+
+def read_snapshot(path: str) -> Optional[Tuple[SourceKey, object]]:
+    """
+    Returns (key, index) from a snapshot file, or None if it is missing or
+    unusable. The index reads its texts and postings from the mapped file.
+    """
+    from src.index import SearchIndex
+
+    try:
+        with open(path, 'rb') as f:
+            if MAP_SNAPSHOTS:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buffer = f.read()
+        magic, version, size, mtime_ns, digest, table_offset = _HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            return None
+        table = json.loads(bytes(buffer[table_offset:]), object_hook=_decode_bytes)
+        index = SearchIndex.from_buffer(buffer, table['sections'], table['meta'])
+        return SourceKey(size, mtime_ns, digest), index
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ignoring unreadable index snapshot: {e}")
+        return None
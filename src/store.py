@@ -0,0 +1,330 @@
+import bz2
+import codecs
+import gzip
+import lzma
+import os
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from src.files import atomic_write
+from src.snapshot import SourceKey, digest_bytes, file_digest, new_digest
+
+# Bytes kept from the start of the file and before the read offset to recognize appends
+EDGE_SIZE = 256
+# Bytes read (or decompressed) at a time
+CHUNK_SIZE = 1 << 20
+# Compressed keyword files are recognized by their first bytes, whatever their name
+COMPRESSIONS = ((b'\x1f\x8b', gzip), (b'BZh', bz2), (b'\xfd7zXZ\x00', lzma))
+
+
+def compression(head: bytes):
+    """The module (gzip, bz2 or lzma) that wrote a file starting with head, or None for plain text."""
+    for magic, module in COMPRESSIONS:
+        if head.startswith(magic):
+            return module
+    return None
+
+
+class FileState(NamedTuple):
+    """What an index knows about the bytes of the keyword file it was built from."""
+    size: int
+    mtime_ns: int
+    # End of the last complete line; later bytes are an unterminated last line
+    offset: int
+    head: bytes
+    # The bytes right before offset
+    tail: bytes
+    # Whether the index's last line is that unterminated one
+    partial: bool
+    # Digest of the bytes before offset, to tell an append from an edit
+    digest: bytes
+
+
+def _split(text: str) -> List[str]:
+    return text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+
+
+def decode_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """
+    Decodes UTF-8 chunks into stripped, non-empty lines. Lines end at LF, CR
+    or CRLF, also across chunks. A character cut off at the very end,
+    as in a file that is still being written, is left out.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    rest = ''
+    for chunk in chunks:
+        text = rest + decoder.decode(chunk)
+        # A \r at the end may be the first half of a \r\n
+        cut = len(text) - 1 if text.endswith('\r') else len(text)
+        lines = _split(text[:cut])
+        rest = lines.pop() + text[cut:]
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield line
+    try:
+        rest += decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        pass
+    for line in _split(rest):
+        line = line.strip()
+        if line:
+            yield line
+
+
+def split_lines(raw: bytes) -> List[str]:
+    """Decodes file contents into stripped, non-empty lines."""
+    return list(decode_lines((raw,)))
+
+
+def stream_diff(old_line: Callable[[int], str], old_count: int, new: Iterable[str],
+                max_changed: int) -> Optional[Tuple[int, int, List[str], int]]:
+    """
+    Compares old_count old lines (looked up through old_line) to the lines
+    of new, read once, by their common prefix and suffix. Returns
+    (start, old_end, changed, new_count): old[start:old_end] became changed.
+    Only up to max_changed new lines are kept while reading, the rest is
+    digested; returns None once the change is bigger than that.
+    """
+    lines = iter(new)
+    start = 0
+    changed = []
+    for line in lines:
+        if start < old_count and line == old_line(start):
+            start += 1
+        else:
+            changed.append(line)
+            break
+    # Past max_changed lines, the rest can only be the old lines' suffix
+    digest = new_digest()
+    digested = 0
+    for line in lines:
+        if len(changed) < max_changed:
+            changed.append(line)
+        else:
+            digest.update(line.encode('utf-8') + b'\n')
+            digested += 1
+    new_count = start + len(changed) + digested
+
+    if digested:
+        if old_count - digested < start:
+            return None
+        old_digest = new_digest()
+        for position in range(old_count - digested, old_count):
+            old_digest.update(old_line(position).encode('utf-8') + b'\n')
+        if old_digest.digest() != digest.digest():
+            return None
+    end = digested
+    limit = min(old_count, new_count) - start
+    while end < limit and changed[len(changed) - 1 - (end - digested)] == old_line(old_count - 1 - end):
+        end += 1
+    del changed[len(changed) - (end - digested):]
+    old_end = old_count - end
+    if (old_end - start) + len(changed) > max_changed:
+        return None
+    return start, old_end, changed, new_count
+
+
+def _line_end(raw: bytes) -> int:
+    return max(raw.rfind(b'\n'), raw.rfind(b'\r')) + 1
+
+
+class _RawReader:
+    """
+    Reads the keyword file's bytes for LineStream (directly, or under a
+    decompressor), keeping its digest and what FileState needs on the way.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = new_digest()
+        self.size = 0
+        self.head = b''
+        self.offset = 0
+        self.tail = b''
+        self.partial = False
+        # Digest of the bytes before offset, and the bytes read since
+        self.prefix = new_digest()
+        self._after = b''
+        # The last EDGE_SIZE bytes read
+        self._window = b''
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.f.read(size)
+        if not data:
+            return data
+        self.digest.update(data)
+        if len(self.head) < EDGE_SIZE:
+            self.head += data[:EDGE_SIZE - len(self.head)]
+        end = _line_end(data)
+        if end:
+            self.offset = self.size + end
+            self.tail = (self._window + data[max(0, end - EDGE_SIZE):end])[-EDGE_SIZE:]
+            self.partial = bool(data[end:].strip())
+            self.prefix.update(self._after)
+            self.prefix.update(data[:end])
+            self._after = data[end:]
+        else:
+            self.partial = self.partial or bool(data.strip())
+            self._after += data
+        self._window = (self._window + data[-EDGE_SIZE:])[-EDGE_SIZE:]
+        self.size += len(data)
+        return data
+
+
+class LineStream:
+    """
+    The stripped, non-empty lines of a keyword file, plain or compressed
+    (gzip, bz2 or xz), read and decoded chunk_size bytes at a time as they
+    are iterated, so reading takes the same memory however large the file.
+    Once iterated, state and digest describe the file bytes that were read.
+    """
+
+    def __init__(self, path: str, chunk_size: int = CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.state: Optional[FileState] = None
+        self.digest: Optional[bytes] = None
+
+    def __iter__(self) -> Iterator[str]:
+        with open(self.path, 'rb') as f:
+            mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+            module = compression(f.read(EDGE_SIZE))
+            f.seek(0)
+            raw = _RawReader(f)
+            yield from decode_lines(self._chunks(module.open(raw, 'rb') if module else raw))
+
+        self.digest = raw.digest.digest()
+        if module:
+            # Appends cannot be read on their own from a compressed file
+            self.state = FileState(raw.size, mtime_ns, raw.size, raw.head, b'', False, self.digest)
+        else:
+            self.state = FileState(raw.size, mtime_ns, raw.offset, raw.head, raw.tail, raw.partial,
+                                   raw.prefix.digest())
+
+    def _chunks(self, source) -> Iterator[bytes]:
+        # read1 hands over what was decompressed so far, so a file cut short
+        # loses only its last piece
+        read = getattr(source, 'read1', source.read)
+        try:
+            yield from iter(lambda: read(self.chunk_size), b'')
+        except EOFError:
+            # A compressed file that is still being written ends early; the
+            # rest is read once it is saved
+            pass
+
+
+class KeywordStore:
+    """
+    Reads and writes the keyword file.
+
+    New keywords are appended as one line each instead of rewriting the file,
+    so it stays in the usual one-phrase-per-line format. Every compact_every
+    appends the file is rewritten once, dropping blank and duplicate lines.
+    Reads can pick up only what other tools appended since a FileState.
+    A compressed file is read as a whole and written compressed the same way.
+    """
+
+    def __init__(self, data_file: str, compact_every: int = 100):
+        self.data_file = data_file
+        self.compact_every = compact_every
+        self.appended = 0
+
+    def stream(self) -> LineStream:
+        """The lines of the whole file, read as they are iterated."""
+        return LineStream(self.data_file)
+
+    def _compression(self):
+        try:
+            with open(self.data_file, 'rb') as f:
+                return compression(f.read(EDGE_SIZE))
+        except FileNotFoundError:
+            return None
+
+    def read_appended(self, state: FileState) -> Optional[Tuple[List[str], FileState]]:
+        """
+        Reads only what was appended to the file since state: the lines from
+        state.offset on (including the unterminated last line again, if any)
+        and the new state. Returns None if the file changed in any other way.
+        """
+        with open(self.data_file, 'rb') as f:
+            st = os.fstat(f.fileno())
+            if st.st_size <= state.size:
+                return None
+            head = f.read(EDGE_SIZE)
+            if head[:len(state.head)] != state.head or compression(head):
+                return None
+            f.seek(state.offset - len(state.tail))
+            if f.read(len(state.tail)) != state.tail:
+                return None
+            # The edges alone miss an edit further up that kept the old lines' length
+            f.seek(0)
+            prefix = new_digest()
+            remaining = state.offset
+            while remaining:
+                data = f.read(min(CHUNK_SIZE, remaining))
+                if not data:
+                    return None
+                prefix.update(data)
+                remaining -= len(data)
+            if prefix.digest() != state.digest:
+                return None
+            chunk = f.read()
+
+        end = _line_end(chunk)
+        tail = (state.tail + chunk[:end])[-EDGE_SIZE:]
+        prefix.update(chunk[:end])
+        new_state = FileState(state.offset + len(chunk), st.st_mtime_ns, state.offset + end,
+                              head, tail, bool(chunk[end:].strip()), prefix.digest())
+        return split_lines(chunk), new_state
+
+    def _end_state(self, digest: bytes = None) -> FileState:
+        """
+        State of a file we just wrote, which always ends with a newline.
+        digest is that of its bytes, if known.
+        """
+        with open(self.data_file, 'rb') as f:
+            st = os.fstat(f.fileno())
+            head = f.read(EDGE_SIZE)
+            f.seek(max(0, st.st_size - EDGE_SIZE))
+            tail = f.read()
+        if digest is None:
+            digest = file_digest(self.data_file)
+        return FileState(st.st_size, st.st_mtime_ns, st.st_size, head, tail, False, digest)
+
+    def _ends_with_newline(self) -> bool:
+        try:
+            with open(self.data_file, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    return True
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) in b'\r\n'
+        except FileNotFoundError:
+            return True
+
+    def append(self, line: str) -> FileState:
+        """Appends a line and returns the file's state afterwards."""
+        module = self._compression()
+        # Don't glue the new line onto an unterminated last line. A compressed
+        # file can't tell cheaply, so it always gets a blank line (skipped on reading).
+        prefix = '' if module is None and self._ends_with_newline() else '\n'
+        # gzip, bz2 and xz files may hold several streams: the new line is one more
+        with (module.open if module else open)(self.data_file, 'at', encoding='utf-8') as f:
+            f.write(prefix + line + '\n')
+        self.appended += 1
+        return self._end_state()
+
+    def should_compact(self) -> bool:
+        return self.compact_every > 0 and self.appended >= self.compact_every
+
+    def rewrite(self, lines: List[str]) -> Tuple[SourceKey, FileState]:
+        """Atomically replaces the file with the given lines, skipping blanks and duplicates."""
+        unique = dict.fromkeys(line for line in lines if line)
+        raw = ''.join(line + '\n' for line in unique).encode('utf-8')
+        module = self._compression()
+        if module:
+            raw = module.compress(raw)
+        with atomic_write(self.data_file, 'wb') as f:
+            f.write(raw)
+        self.appended = 0
+        state = self._end_state(digest_bytes(raw))
+        return SourceKey(state.size, state.mtime_ns, state.digest), state
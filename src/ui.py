@@ -1,21 +1,55 @@
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, 
-    QListWidget, QApplication, QPushButton
+    QListView, QApplication, QPushButton, QBoxLayout
 )
-from PyQt6.QtCore import Qt, QSize, pyqtSignal, QTimer, QEvent
+from PyQt6.QtCore import Qt, QSize, pyqtSignal, QEvent
 from PyQt6.QtGui import QColor, QFont, QKeyEvent, QCursor
-import os
+from src.index import PREFIX
+from src.metrics import tracer
+from src.providers import FederatedSearch
+from src.results_model import ResultListModel
+from src.worker import SearchWorker
 import ctypes
 import sys
 
 class SearchOverlay(QMainWindow):
-    def __init__(self, search_engine):
+    # True when the overlay is shown, False when it is hidden
+    visibility_changed = pyqtSignal(bool)
+
+    def __init__(self, search_engine, debounce_ms=30, mode=PREFIX, hotkey_char='f', providers=()):
         super().__init__()
         self.search_engine = search_engine
-        self._text_before_show = ""
+        # Lets each keystroke refine the previous results instead of searching from scratch
+        self.search_session = search_engine.session()
+        # Searches run on a worker thread so typing never waits for them
+        self.search_worker = SearchWorker(self.search_session, debounce_ms, mode=mode, parent=self)
+        self.search_worker.results_ready.connect(self.show_results)
+        # Other sources (clipboard, commands, files...) answer on their own
+        # threads, each within its deadline, and are listed after the keyword
+        # results as they come in
+        self.federated_search = FederatedSearch(providers, debounce_ms, parent=self) if providers else None
+        if self.federated_search:
+            self.federated_search.results_ready.connect(self.show_provider_results)
+        # Query of the provider rows shown, and their lines by provider name
+        self._provider_query = None
+        self._provider_rows = {}
+        self._enter_pending = False
+        # Last key of the show hotkey: while it is still held after showing,
+        # its key presses would land in the input (None if it types nothing)
+        self.hotkey_char = hotkey_char
+        self._artifact_guard = False
+        # Engine generation of the last search requested, and of the results shown
+        self._requested_generation = None
+        self._results_generation = None
+        self.search_direction = 'down'
         self.last_active_window_handle = None
         self.init_ui()
 
+        # Create the native window and apply the styles now, so the first
+        # hotkey press does not pay for them
+        self.ensurePolished()
+        self.winId()
+
         # Connect data reload signal
         if hasattr(self.search_engine, 'data_changed'):
             self.search_engine.data_changed.connect(self.on_data_changed)
@@ -63,6 +97,7 @@ class SearchOverlay(QMainWindow):
         self.input_field.setFixedHeight(40)
         self.input_field.textEdited.connect(self.on_text_changed)
         self.input_field.returnPressed.connect(self.on_enter_pressed)
+        self.input_field.installEventFilter(self)
         
         # Add Button
         self.add_button = QPushButton("+")
@@ -74,15 +109,19 @@ class SearchOverlay(QMainWindow):
         self.input_row_layout.addWidget(self.input_field)
         self.input_row_layout.addWidget(self.add_button)
         
-        # Suggestions List
-        self.list_widget = QListWidget()
-        self.list_widget.setVisible(False)
-        self.list_widget.itemClicked.connect(self.on_item_clicked)
-        self.list_widget.itemSelectionChanged.connect(self.on_selection_changed)
-        self.list_widget.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        # Suggestions List: rows are updated in place and further pages are
+        # fetched lazily when scrolling past the end
+        self.results_model = ResultListModel(parent=self)
+        self.list_view = QListView()
+        self.list_view.setModel(self.results_model)
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setVisible(False)
+        self.list_view.clicked.connect(self.on_item_clicked)
+        self.list_view.selectionModel().currentChanged.connect(self.on_selection_changed)
+        self.list_view.setFocusPolicy(Qt.FocusPolicy.NoFocus)
 
         self.container_layout.addWidget(self.input_row)
-        self.container_layout.addWidget(self.list_widget)
+        self.container_layout.addWidget(self.list_view)
 
         # Styles
         self.apply_styles()
@@ -119,7 +158,7 @@ class SearchOverlay(QMainWindow):
             QLineEdit:focus {
                 border: 1px solid #0078d4;
             }
-            QListWidget {
+            QListView {
                 background-color: #2d2d2d;
                 color: #e0e0e0;
                 border: none;
@@ -128,16 +167,16 @@ class SearchOverlay(QMainWindow):
                 margin-top: 5px;
                 font-size: 14px;
             }
-            QListWidget::item {
+            QListView::item {
                 padding: 6px 8px;
                 min-height: 20px;
                 border-radius: 4px;
             }
-            QListWidget::item:selected {
+            QListView::item:selected {
                 background-color: #0078d4;
                 color: white;
             }
-            QListWidget::item:hover {
+            QListView::item:hover {
                 background-color: #3d3d3d;
             }
             QPushButton {
@@ -171,16 +210,11 @@ class SearchOverlay(QMainWindow):
         if space_below < max_needed_height:
             self.search_direction = 'up'
 
-        if self.search_direction == 'up':
-            self.container_layout.removeWidget(self.input_row)
-            self.container_layout.removeWidget(self.list_widget)
-            self.container_layout.addWidget(self.list_widget)
-            self.container_layout.addWidget(self.input_row)
-        else:
-            self.container_layout.removeWidget(self.input_row)
-            self.container_layout.removeWidget(self.list_widget)
-            self.container_layout.addWidget(self.input_row)
-            self.container_layout.addWidget(self.list_widget)
+        # Opening upwards puts the list above the input: only the layout's
+        # direction flips, the widgets stay where they are
+        direction = QBoxLayout.Direction.BottomToTop if self.search_direction == 'up' else QBoxLayout.Direction.TopToBottom
+        if self.container_layout.direction() != direction:
+            self.container_layout.setDirection(direction)
 
         x = cursor_pos.x()
         if x + self.width() > screen_geo.right():
@@ -197,53 +231,95 @@ class SearchOverlay(QMainWindow):
             self.on_text_changed(self.input_field.text())
 
     def on_text_changed(self, text):
+        tracer.begin('keystroke')
+        self._enter_pending = False
         if not text:
-            self.list_widget.clear()
-            self.list_widget.setVisible(False)
+            self.search_worker.cancel()
+            if self.federated_search:
+                self.federated_search.cancel()
+            self.results_model.set_results(None)
+            self._set_provider_rows(None, {})
+            self.list_view.setVisible(False)
             self.adjust_size()
+            tracer.end('keystroke', 'clear')
             return
 
-        results = self.search_engine.search(text)
-        
-        self.list_widget.itemSelectionChanged.disconnect(self.on_selection_changed)
-        
-        self.list_widget.clear()
-        
-        if results:
-            self.list_widget.addItems(results)
-            self.user_navigating = False
-            self.list_widget.setCurrentRow(0)
-            self.list_widget.setVisible(True)
+        self._request_search(text)
+
+    def _request_search(self, text, immediate=False):
+        self._requested_generation = getattr(self.search_engine, 'generation', None)
+        self.search_worker.request(text, immediate)
+        if self.federated_search:
+            self.federated_search.request(text, immediate)
+
+    def show_results(self, query, results):
+        tracer.mark('keystroke', 'deliver')
+        # Only the latest request is delivered
+        self._results_generation = self._requested_generation
+        # Row changes caused by the update must not be copied into the input
+        self.user_navigating = False
+        self.results_model.set_results(results)
+        if self._provider_query != query:
+            # Provider rows of an older query
+            self._set_provider_rows(None, {})
+
+        if self.results_model.rowCount():
+            tracer.mark('keystroke', 'update_model')
+            self.set_current_row(0)
+        self._resize_list()
+        tracer.end('keystroke', 'adjust_size')
+
+        # Enter was pressed before these results arrived
+        if self._enter_pending and self.isVisible():
+            self._enter_pending = False
+            self.on_enter_pressed()
+
+    def show_provider_results(self, query, name, lines):
+        """Lists a provider's lines after the keyword results, in provider order."""
+        rows = dict(self._provider_rows) if query == self._provider_query else {}
+        rows[name] = lines
+        self.user_navigating = False
+        self._set_provider_rows(query, rows)
+        if self.current_row() < 0 and self.results_model.rowCount():
+            self.set_current_row(0)
+        self._resize_list()
+
+    def _set_provider_rows(self, query, rows):
+        if not rows and not self._provider_rows:
+            return
+        self._provider_query = query
+        self._provider_rows = rows
+        providers = self.federated_search.providers if self.federated_search else ()
+        self.results_model.set_extra([line for provider in providers
+                                      for line in rows.get(provider.name, ())])
+
+    def _resize_list(self):
+        count = self.results_model.rowCount()
+        if count:
+            self.list_view.setVisible(True)
             
-            # Dynamic height calculation
-            count = min(len(results), 6)
-            list_height = 0
-            if count > 0:
-                for i in range(count):
-                    # Use sizeHintForRow for an accurate height, with a fallback
-                    h = self.list_widget.sizeHintForRow(i)
-                    list_height += h if h > 0 else 32
+            # Dynamic height calculation: all rows have the size of the first one
+            h = self.list_view.sizeHintForRow(0)
+            list_height = (h if h > 0 else 32) * min(count, 6)
             
             list_height += 4 # Padding
-            self.list_widget.setFixedHeight(list_height)
+            self.list_view.setFixedHeight(list_height)
         else:
-            self.list_widget.setVisible(False)
-        
-        self.list_widget.itemSelectionChanged.connect(self.on_selection_changed)
+            self.list_view.setVisible(False)
         
         self.adjust_size()
 
     def adjust_size(self):
         base_height = 60 
-        if self.list_widget.isVisible():
-            base_height += self.list_widget.height() + 5
+        if self.list_view.isVisible():
+            base_height += self.list_view.height() + 5
         
         old_height = self.height()
         new_height = base_height
         
         self.setFixedSize(self.width(), new_height)
         
-        if hasattr(self, 'search_direction') and self.search_direction == 'up':
+        if self.search_direction == 'up':
             diff = new_height - old_height
             if diff != 0:
                 self.move(self.x(), self.y() - diff)
@@ -254,20 +330,10 @@ class SearchOverlay(QMainWindow):
             return
         
         try:
-            existing = []
-            if os.path.exists(self.search_engine.data_file):
-                with open(self.search_engine.data_file, 'r', encoding='utf-8') as f:
-                    existing = [line.strip() for line in f.readlines() if line.strip()]
-            
-            if text in existing:
+            if not self.search_engine.add_keyword(text):
                 print(f"Keyword '{text}' already exists.")
                 return
             
-            with open(self.search_engine.data_file, 'w', encoding='utf-8') as f:
-                f.write(text + '\n')
-                for line in existing:
-                    f.write(line + '\n')
-            
             print(f"Added keyword: {text}")
             
             self.input_field.clear()
@@ -280,29 +346,41 @@ class SearchOverlay(QMainWindow):
             self.hide()
 
     def on_enter_pressed(self):
-        current_item = self.list_widget.currentItem()
-        if current_item and self.list_widget.isVisible():
-            self.select_item(current_item.text())
+        if self.search_worker.busy:
+            # The list still shows an older query; act once it is up to date
+            self._enter_pending = True
+            return
+
+        current_text = self.results_model.row_text(self.current_row())
+        if current_text and self.list_view.isVisible():
+            self.select_item(current_text)
         elif self.input_field.text():
             self.select_item(self.input_field.text())
         else:
             self.hide()
 
-    def on_item_clicked(self, item):
-        self.select_item(item.text())
+    def on_item_clicked(self, index):
+        self.select_item(self.results_model.row_text(index.row()))
 
     def on_selection_changed(self):
         if not self.user_navigating:
             return
             
-        current_item = self.list_widget.currentItem()
-        if current_item:
+        current_text = self.results_model.row_text(self.current_row())
+        if current_text:
             self.input_field.blockSignals(True)
-            self.input_field.setText(current_item.text())
+            self.input_field.setText(current_text)
             self.input_field.blockSignals(False)
 
+    def current_row(self):
+        return self.list_view.currentIndex().row()
+
+    def set_current_row(self, row):
+        self.list_view.setCurrentIndex(self.results_model.index(row))
+
     def select_item(self, text):
         clipboard = QApplication.clipboard()
+        self.search_engine.record_selection(text)
         
         if '||' in text:
             parts = text.split('||', 1)
@@ -329,21 +407,24 @@ class SearchOverlay(QMainWindow):
         if event.key() == Qt.Key.Key_Escape:
             self.hide()
         elif event.key() == Qt.Key.Key_Down:
-            if self.list_widget.isVisible() and self.list_widget.count() > 0:
+            if self.list_view.isVisible() and self.results_model.rowCount() > 0:
                 self.user_navigating = True
-                curr = self.list_widget.currentRow()
-                if curr < self.list_widget.count() - 1:
-                    self.list_widget.setCurrentRow(curr + 1)
+                curr = self.current_row()
+                # Load the next page before wrapping around
+                if curr >= self.results_model.rowCount() - 1 and self.results_model.canFetchMore():
+                    self.results_model.fetchMore()
+                if curr < self.results_model.rowCount() - 1:
+                    self.set_current_row(curr + 1)
                 else:
-                    self.list_widget.setCurrentRow(0)
+                    self.set_current_row(0)
         elif event.key() == Qt.Key.Key_Up:
-            if self.list_widget.isVisible() and self.list_widget.count() > 0:
+            if self.list_view.isVisible() and self.results_model.rowCount() > 0:
                 self.user_navigating = True
-                curr = self.list_widget.currentRow()
+                curr = self.current_row()
                 if curr > 0:
-                    self.list_widget.setCurrentRow(curr - 1)
+                    self.set_current_row(curr - 1)
                 else:
-                    self.list_widget.setCurrentRow(self.list_widget.count() - 1)
+                    self.set_current_row(self.results_model.rowCount() - 1)
         else:
             super().keyPressEvent(event)
 
@@ -351,10 +432,34 @@ class SearchOverlay(QMainWindow):
         """Hides the window when it loses focus (is deactivated)."""
         super().changeEvent(event)
         if event.type() == QEvent.Type.ActivationChange:
-            if not self.isActiveWindow():
+            if self.isActiveWindow():
+                # However late the window manager activates us, the input gets the focus
+                self.input_field.setFocus()
+                self.input_field.end(False)
+            else:
                 self.hide()
 
+    def eventFilter(self, obj, event):
+        if obj is self.input_field and self._artifact_guard and event.type() == QEvent.Type.KeyPress:
+            # The hotkey's key, still held down (with its modifiers, or
+            # repeating) when the input took the focus, is not typing
+            held = event.isAutoRepeat() or event.modifiers() & (
+                Qt.KeyboardModifier.ControlModifier | Qt.KeyboardModifier.AltModifier)
+            if held and event.key() == ord(self.hotkey_char.upper()):
+                return True
+            self._artifact_guard = False
+        return super().eventFilter(obj, event)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.visibility_changed.emit(True)
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.visibility_changed.emit(False)
+
     def show_search(self):
+        tracer.mark('hotkey', 'dispatch')
         # Store previous active window to restore focus later
         if sys.platform == "win32":
             try:
@@ -364,10 +469,10 @@ class SearchOverlay(QMainWindow):
                 print(f"Could not get foreground window: {e}")
                 self.last_active_window_handle = None
 
-        # Store text before showing to handle hotkey artifact
-        self._text_before_show = self.input_field.text()
+        self._artifact_guard = bool(self.hotkey_char) and len(self.hotkey_char) == 1
 
         self.position_at_cursor()
+        self._show_cached_results()
         self.adjust_size()
         
         self.show()
@@ -398,21 +503,21 @@ class SearchOverlay(QMainWindow):
 
         self.input_field.setFocus()
         self.input_field.end(False)
-        
-        QTimer.singleShot(50, self._delayed_focus)
-        QTimer.singleShot(100, self._delayed_focus)
-        QTimer.singleShot(50, self._clean_hotkey_artifact)
-
-        # Trigger search for any pre-existing text when shown
-        QTimer.singleShot(110, lambda: self.on_text_changed(self.input_field.text()))
-
-    def _delayed_focus(self):
-        if self.isVisible():
-            self.input_field.setFocus()
-            self.input_field.end(False)
-    
-    def _clean_hotkey_artifact(self):
-        if self.isVisible():
-            current_text = self.input_field.text()
-            if current_text.lower() == (self._text_before_show + 'f').lower():
-                self.input_field.setText(self._text_before_show)
+        tracer.end('hotkey', 'show')
+
+    def _show_cached_results(self):
+        """
+        Keeps the last results up when they are still those of the current
+        text; otherwise they stay up while a search for it starts right away.
+        """
+        text = self.input_field.text()
+        if not text:
+            if self.results_model.results is not None:
+                # Cleared after a pick: drop the list that went with it
+                self.on_text_changed(text)
+            return
+        results = self.results_model.results
+        if (results is not None and results.query == text
+                and self._results_generation == getattr(self.search_engine, 'generation', None)):
+            return
+        self._request_search(text, immediate=True)
@@ -0,0 +1,100 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from src.index import EXACT
+from src.metrics import tracer
+
+
+class _SearchJob(QRunnable):
+    def __init__(self, worker, generation: int, query: str):
+        super().__init__()
+        self.worker = worker
+        self.generation = generation
+        self.query = query
+
+    def run(self):
+        self.worker._run(self.generation, self.query)
+
+
+class SearchWorker(QObject):
+    """
+    Runs the overlay's searches off the GUI thread.
+
+    Requests are debounced so a burst of keystrokes only searches once, and
+    every request bumps a generation counter: results for a query that was
+    superseded in the meantime are dropped instead of being rendered.
+    Results are delivered as SearchResults holding the first limit rows.
+    """
+    results_ready = pyqtSignal(str, object)
+    _finished = pyqtSignal(int, str, object)
+
+    def __init__(self, search_session, debounce_ms: int = 30, limit: int = 10, mode: str = EXACT, parent=None):
+        super().__init__(parent)
+        self.search_session = search_session
+        self.limit = limit
+        self.mode = mode
+        self.generation = 0
+        self._delivered = 0
+        self._pending = None
+
+        # One thread only: sessions are not thread-safe and queries must run in order
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(debounce_ms)
+        self.debounce_timer.timeout.connect(self._dispatch)
+
+        self._finished.connect(self._on_finished)
+
+    @property
+    def busy(self) -> bool:
+        """True while the latest request has not been delivered yet."""
+        return self._delivered != self.generation
+
+    def set_debounce(self, debounce_ms: int):
+        self.debounce_timer.setInterval(debounce_ms)
+
+    def request(self, query: str, immediate: bool = False):
+        """
+        Schedules a search; any earlier request still in flight becomes stale.
+        immediate skips the debounce, for searches not caused by typing.
+        """
+        self.generation += 1
+        self._pending = query
+        if immediate:
+            self.debounce_timer.stop()
+            self._dispatch()
+        else:
+            self.debounce_timer.start()
+
+    def cancel(self):
+        """Drops the pending request and any result still in flight."""
+        self.generation += 1
+        self._delivered = self.generation
+        self._pending = None
+        self.debounce_timer.stop()
+
+    def _dispatch(self):
+        if self._pending is None:
+            return
+        tracer.mark('keystroke', 'debounce')
+        self.pool.start(_SearchJob(self, self.generation, self._pending))
+        self._pending = None
+
+    def _run(self, generation: int, query: str):
+        # Runs on the pool thread. Skip queries superseded while waiting.
+        if generation != self.generation:
+            return
+        try:
+            results = self.search_session.search_results(query, self.limit, self.mode)
+        except Exception as e:
+            print(f"Search error: {e}")
+            results = None
+        tracer.mark('keystroke', 'search')
+        self._finished.emit(generation, query, results)
+
+    def _on_finished(self, generation: int, query: str, results):
+        if generation != self.generation:
+            return
+        self._delivered = generation
+        self.results_ready.emit(query, results)
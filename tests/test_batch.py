@@ -0,0 +1,23 @@
+import io
+import json
+import os
+
+import pytest
+
+import batch
+from src.cache import cache_path
+
+
+def test_negative_limit_is_rejected():
+    with pytest.raises(SystemExit):
+        batch.main(['--limit', '-1'])
+
+
+def test_run_saves_the_cached_queries(qapp, tmp_path):
+    path = str(tmp_path / 'keyword.txt')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('deploy prod\nhello world\n')
+    output = io.StringIO()
+    assert batch.run(iter(['deploy', 'hello']), output, path, limit=0, workers=1) == 2
+    assert [json.loads(line)['results'] for line in output.getvalue().splitlines()] == [[], []]
+    assert os.path.exists(cache_path(path))
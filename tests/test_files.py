@@ -0,0 +1,23 @@
+import pytest
+
+from src.files import atomic_write
+
+
+def test_atomic_write_replaces_the_file(tmp_path):
+    path = tmp_path / 'data.json'
+    path.write_text('old', encoding='utf-8')
+    with atomic_write(str(path), encoding='utf-8') as f:
+        f.write('new')
+    assert path.read_text(encoding='utf-8') == 'new'
+    assert [p.name for p in tmp_path.iterdir()] == ['data.json']
+
+
+def test_failed_write_keeps_the_old_file(tmp_path):
+    path = tmp_path / 'data.json'
+    path.write_text('old', encoding='utf-8')
+    with pytest.raises(ValueError):
+        with atomic_write(str(path), encoding='utf-8') as f:
+            f.write('half')
+            raise ValueError('failed')
+    assert path.read_text(encoding='utf-8') == 'old'
+    assert [p.name for p in tmp_path.iterdir()] == ['data.json']
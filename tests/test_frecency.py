@@ -0,0 +1,39 @@
+import pytest
+
+from src.index import EXACT, FUZZY, PREFIX
+from src.search import SearchEngine
+
+
+@pytest.fixture
+def engine(qapp, tmp_path):
+    path = tmp_path / 'keyword.txt'
+    path.write_text('deploy app || kubectl apply\nredeploy || again\ndeploy db || migrate\n'
+                    'deploy web\ntools || deploy scripts\n', encoding='utf-8')
+    engine = SearchEngine(str(path), cache_size=0)
+    yield engine
+    engine.close()
+
+
+def test_picks_move_up_within_their_tier(engine):
+    assert engine.record_selection('redeploy || again')
+    assert engine.record_selection('tools || deploy scripts')
+    # Shortcut prefix hits still come before a picked substring hit
+    assert engine.search('dep', 10, PREFIX) == [
+        'deploy app || kubectl apply', 'deploy db || migrate', 'deploy web',
+        'redeploy || again', 'tools || deploy scripts']
+    # Within the shortcut tier the pick goes first; content hits stay last
+    assert engine.search('deploy', 10, EXACT) == [
+        'redeploy || again', 'deploy app || kubectl apply', 'deploy db || migrate', 'deploy web',
+        'tools || deploy scripts']
+    assert engine.session().search('deploy', 10, EXACT) == engine.search('deploy', 10, EXACT)
+
+
+def test_picks_only_break_near_ties_in_fuzzy_results(engine):
+    engine.record_selection('redeploy || again')
+    engine.record_selection('deploy web')
+    results = engine.search('deploy', 10, FUZZY)
+    # Among the lines starting a word with "deploy", the picked one goes first...
+    assert results[0] == 'deploy web'
+    # ...but a picked line matching mid-word stays below them
+    assert results.index('redeploy || again') > results.index('deploy db || migrate')
+    assert engine.search('dpeloy', 10, FUZZY)[0] == 'deploy web'
@@ -0,0 +1,20 @@
+from src.index import SearchIndex
+
+
+def test_fuzzy_search_with_no_room_returns_nothing():
+    index = SearchIndex(['deploy prod || kubectl apply', 'deplyo staging'])
+    assert index.fuzzy_search(['deploy'], 0) == []
+    assert index.fuzzy_search(['de'], 0) == []
+    assert index.fuzzy_search(['deploy'], 1) == ['deploy prod || kubectl apply']
+
+
+def test_find_looks_lines_up_exactly():
+    index = SearchIndex(['en', 'deploy prod || kubectl apply', 'x || y'])
+    assert 'en' in index and 'x || y' in index
+    assert 'e' not in index and 'deploy prod' not in index
+    index.replace(0, 1, ['fr'])
+    index.add('de')
+    assert 'en' not in index
+    assert index.find('fr') == 3 and index.find('de') == 4
+    index.sort_line_keys()
+    assert 'de' in index and 'fr' in index and 'en' not in index
@@ -0,0 +1,46 @@
+import pytest
+
+from src.search import SearchEngine
+
+
+@pytest.fixture
+def engine(qapp, tmp_path):
+    path = tmp_path / 'keyword.txt'
+    path.write_text(''.join(f'deploy {i} || run {i}\n' for i in range(30)), encoding='utf-8')
+    engine = SearchEngine(str(path))
+    yield engine
+    engine.close()
+
+
+def test_cached_page_is_continued_without_the_session(engine):
+    expected = engine.search('deploy', 100)
+    session = engine.session()
+    assert session.search('deploy', 10) == expected[:10]
+
+    def tiers(*args):
+        raise AssertionError("session used outside the search thread")
+
+    session.tiers = tiers
+    results = session.search_results('deploy', 10)
+    assert results.rows == expected[:10]
+    results.fetch(100)
+    assert results.rows == expected
+    assert engine.cache.stats()['hits'] == 1
+
+
+def test_saved_queries_are_warmed_after_the_reload(qapp, tmp_path):
+    path = tmp_path / 'keyword.txt'
+    path.write_text('deploy prod\nhello world\n', encoding='utf-8')
+    engine = SearchEngine(str(path))
+    engine.search('deploy')
+    engine.close()
+    # A stale snapshot: the warmed results must be those of the reloaded index
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('deploy new\n')
+    engine = SearchEngine(str(path))
+    try:
+        engine.after_load(lambda: None).result()
+        assert engine.search('deploy') == ['deploy prod', 'deploy new']
+        assert engine.cache.stats()['hits'] == 1
+    finally:
+        engine.close()
@@ -0,0 +1,43 @@
+import pickle
+
+from src.index import SearchIndex
+from src.snapshot import SourceKey, read_snapshot, write_snapshot
+from src.store import KeywordStore
+
+
+def build(tmp_path, lines):
+    path = tmp_path / 'keyword.txt'
+    path.write_text(''.join(line + '\n' for line in lines), encoding='utf-8')
+    stream = KeywordStore(str(path)).stream()
+    index = SearchIndex(stream)
+    index.source = stream.state
+    key = SourceKey(stream.state.size, stream.state.mtime_ns, stream.digest)
+    snapshot = str(tmp_path / 'keyword.txt.idx')
+    write_snapshot(snapshot, key, index)
+    return snapshot, key, index
+
+
+def test_snapshot_round_trip(tmp_path):
+    snapshot, key, index = build(tmp_path, ['deploy prod || kubectl apply', 'hello world'])
+    read_key, loaded = read_snapshot(snapshot)
+    assert read_key == key
+    assert loaded.source == index.source
+    assert loaded.file_lines() == ['deploy prod || kubectl apply', 'hello world']
+    assert loaded.search(['kube'], 10) == ['deploy prod || kubectl apply']
+    assert 'hello world' in loaded
+
+
+class Payload:
+    def __reduce__(self):
+        return exec, ("raise SystemExit('code ran')",)
+
+
+def test_snapshot_table_is_never_unpickled(tmp_path):
+    snapshot, _, _ = build(tmp_path, ['hello world'])
+    with open(snapshot, 'rb') as f:
+        data = f.read()
+    # Swap the table for a pickle that would run code if it were loaded
+    start = data.rindex(b'{"sections"')
+    with open(snapshot, 'wb') as f:
+        f.write(data[:start] + pickle.dumps(Payload()))
+    assert read_snapshot(snapshot) is None
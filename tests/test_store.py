@@ -0,0 +1,88 @@
+import gzip
+import random
+
+import pytest
+
+from src.store import KeywordStore, LineStream, stream_diff
+
+
+def diff(old, new, max_changed=100):
+    return stream_diff(old.__getitem__, len(old), iter(new), max_changed)
+
+
+def test_stream_diff_finds_the_changed_lines():
+    old = ['a', 'b', 'c', 'd', 'e']
+    assert diff(old, old) == (5, 5, [], 5)
+    assert diff(old, ['a', 'b', 'x', 'y', 'd', 'e']) == (2, 3, ['x', 'y'], 6)
+    assert diff(old, ['b', 'c', 'd', 'e']) == (0, 1, [], 4)
+    assert diff(old, ['a', 'b', 'c', 'd', 'e', 'f']) == (5, 5, ['f'], 6)
+    assert diff([], ['a']) == (0, 0, ['a'], 1)
+
+
+def test_stream_diff_gives_up_on_big_changes():
+    old = [str(i) for i in range(100)]
+    assert diff(old, ['x'] + old[1:], max_changed=2) == (0, 1, ['x'], 100)
+    assert diff(old, ['x', 'y'] + old[2:], max_changed=2) is None
+    assert diff(old, ['x'] + old[1:50] + ['y'] + old[51:], max_changed=2) is None
+
+
+def test_stream_diff_matches_a_list_diff():
+    rng = random.Random(1)
+    for _ in range(2000):
+        old = [str(rng.randrange(5)) for _ in range(rng.randrange(20))]
+        new = list(old)
+        i = rng.randrange(len(new) + 1)
+        new[i:i + rng.randrange(3)] = [str(rng.randrange(5)) for _ in range(rng.randrange(3))]
+        result = diff(old, new, max_changed=6)
+        if result is not None:
+            start, old_end, changed, count = result
+            assert old[:start] + changed + old[old_end:] == new
+            assert count == len(new)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return KeywordStore(str(tmp_path / 'keyword.txt'))
+
+
+def read(store):
+    stream = store.stream()
+    return list(stream), stream.state
+
+
+def test_read_appended_reads_only_new_lines(store):
+    with open(store.data_file, 'w') as f:
+        f.write('one\ntwo\n')
+    _, state = read(store)
+    with open(store.data_file, 'a') as f:
+        f.write('three\nfou')
+    lines, state = store.read_appended(state)
+    assert lines == ['three', 'fou'] and state.partial
+    with open(store.data_file, 'a') as f:
+        f.write('r\n')
+    lines, state = store.read_appended(state)
+    assert lines == ['four'] and not state.partial
+    assert read(store)[1] == state
+
+
+def test_read_appended_refuses_other_changes(store):
+    with open(store.data_file, 'w') as f:
+        f.write('one\ntwo\nthree\n')
+    _, state = read(store)
+    # Same length edit away from both edges, then an append
+    with open(store.data_file, 'w') as f:
+        f.write('one\nTWO\nthree\nfour\n')
+    assert store.read_appended(state) is None
+    with open(store.data_file, 'w') as f:
+        f.write('one\ntwo\n')
+    assert store.read_appended(state) is None
+
+
+def test_compressed_files_are_read_whole(store):
+    with gzip.open(store.data_file, 'wt') as f:
+        f.write('one\ntwo\n')
+    lines, state = read(store)
+    assert lines == ['one', 'two']
+    store.append('three')
+    assert store.read_appended(state) is None
+    assert list(LineStream(store.data_file)) == ['one', 'two', 'three']
@@ -0,0 +1,79 @@
+import os
+import time
+
+import pytest
+
+from src.index import PREFIX
+from src.search import SearchEngine
+
+
+@pytest.fixture
+def engine(qapp, tmp_path):
+    path = str(tmp_path / 'keyword.txt')
+    write(path, ['apple one', 'apple two', 'apple three'])
+    engine = SearchEngine(path, reload_delay_ms=10)
+    engine.changes = []
+    engine.data_changed.connect(lambda: engine.changes.append(len(engine.index)))
+    yield engine
+    engine.close()
+
+
+def write(path, lines, mode='w'):
+    with open(path, mode, encoding='utf-8') as f:
+        f.write(''.join(line + '\n' for line in lines))
+    # Make sure a rewrite of the same size gets a new mtime
+    os.utime(path, ns=(time.time_ns(), time.time_ns()))
+
+
+def sync(engine, qapp):
+    engine._sync_job()
+    qapp.processEvents()
+
+
+def test_append_is_read_incrementally(engine, qapp):
+    write(engine.data_file, ['apple four'], 'a')
+    sync(engine, qapp)
+    assert engine.search('apple') == ['apple one', 'apple two', 'apple three', 'apple four']
+    assert engine.index.in_order
+    assert engine.changes == [4]
+
+
+def test_middle_edit_keeps_file_order(engine, qapp):
+    write(engine.data_file, ['apple one', 'apple TWO', 'apple new', 'apple three'])
+    sync(engine, qapp)
+    index = engine.index
+    assert not index.in_order
+    assert engine.search('apple') == ['apple one', 'apple TWO', 'apple new', 'apple three']
+    assert engine.search('apple', mode=PREFIX) == ['apple one', 'apple TWO', 'apple new', 'apple three']
+    assert engine.session().search('apple t') == ['apple TWO', 'apple three']
+    # Applied in place, announced once
+    assert engine.index is index
+    assert engine.changes == [4]
+
+
+def test_big_change_rebuilds(engine, qapp, monkeypatch):
+    import src.search
+    monkeypatch.setattr(src.search, 'MAX_DIFF_LINES', 1)
+    write(engine.data_file, ['pear', 'plum', 'apple three'])
+    old = engine.index
+    sync(engine, qapp)
+    assert engine.index is not old and engine.index.in_order
+    assert engine.search('p') == ['pear', 'plum', 'apple three']
+    assert engine.changes == [3]
+
+
+def test_unchanged_file_is_not_announced(engine, qapp):
+    write(engine.data_file, ['apple one', 'apple two', 'apple three'])
+    sync(engine, qapp)
+    assert engine.changes == []
+
+
+def test_added_keyword_is_announced_once(engine, qapp):
+    # An outside edit still pending is picked up by the same job
+    write(engine.data_file, ['apple one', 'apple 2', 'apple three'])
+    assert engine.add_keyword('apple four')
+    engine._index_thread.submit(lambda: None).result()
+    qapp.processEvents()
+    assert engine.search('apple') == ['apple one', 'apple 2', 'apple three', 'apple four']
+    assert engine.changes == [4]
+    assert not engine.add_keyword('apple four')